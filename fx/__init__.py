@@ -13,7 +13,7 @@ will expand to
 
 Usage:
     fx [-d] [-n] [-q] -c COMMAND FILE ...
-    fx [-d] [-n] [-q] -x -c COMMAND
+    fx [-d] [-n] [-q] [--max-chars N] [--max-args N] -x -c COMMAND
     fx [-d] [-n] [-q] -i RANGE -c COMMAND
     fx [-d] [-n] [-q] -e SUBSTITUTION FILE ...
 
@@ -25,6 +25,8 @@ Options
     -e        SUBSTITUTION -- a substitute expression: s/foo/bar/
     -i        RANGE -- <low number>:<high number>
     -x        Bundle strings from stdin like xargs into '%'
+    --max-args N   put at most N strings on each command line
+    --max-chars N  keep command lines to N bytes (default: from ARG_MAX)
 
 
 LICENSE
@@ -47,12 +49,17 @@ but WITHOUT ANY WARRANTY; without even the implied warranty of
 MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 GNU General Public License for more details.
 """
-import docopt
 import os
-import pdb
-import re
+import struct
 import sys
-import tbx
+
+# Everything else is imported where it's used: 'python fx' imports this
+# package before doing anything, and most of what's here isn't needed to
+# start up
+
+
+# Linux caps any single argument handed to exec() at 32 pages
+MAX_ARG_STRLEN = 32 * 4096
 
 
 # -----------------------------------------------------------------------------
@@ -60,8 +67,10 @@ def main():
     """
     main entrypoint
     """
+    import docopt
     opts = docopt.docopt(__doc__)
     if opts['-d']:
+        import pdb
         pdb.set_trace()
 
     if opts['-e']:
@@ -74,6 +83,50 @@ def main():
         subst_command(opts)
 
 
+# ---------------------------------------------------------------------------
+def arg_max(shell=True):
+    """
+    The longest command line, in bytes, we can hand to exec().
+
+    This is ARG_MAX less what the environment takes up and less 2048 bytes of
+    headroom, as xargs does it. If the command line is going to a shell, it's
+    passed as a single argument, so on Linux it is also held to
+    MAX_ARG_STRLEN no matter how large ARG_MAX is.
+    """
+    try:
+        limit = os.sysconf('SC_ARG_MAX')
+    except (ValueError, OSError):
+        limit = -1
+    if limit <= 0:
+        limit = 4096
+    ptr = struct.calcsize('P')
+    limit -= sum(len(key) + len(val) + 2 + ptr
+                 for key, val in os.environb.items())
+    limit -= 2048
+    if shell and sys.platform.startswith('linux'):
+        limit = min(limit, MAX_ARG_STRLEN - 1)
+    return max(limit, 0)
+
+
+# ---------------------------------------------------------------------------
+def whole_number(text, option, default=None):
+    """
+    The number *text* gives for *option*, or *default* if it's None or
+    empty. Exit with a usage message if it isn't a whole number of at least
+    1.
+    """
+    if not text:
+        return default
+    try:
+        rval = int(text)
+    except ValueError:
+        rval = 0
+    if rval < 1:
+        sys.exit("{} must be a whole number, at least 1, not {}"
+                 .format(option, text))
+    return rval
+
+
 # ---------------------------------------------------------------------------
 def batch_command(options, arglist=None, rble=sys.stdin):
     """
@@ -82,22 +135,21 @@ def batch_command(options, arglist=None, rble=sys.stdin):
     Unlike xargs, this version allows for static values following the
     list of arguments on each command line.
     """
-    for cmd in xargs_wrap(options['COMMAND'], rble):
-        psys(cmd, options)
+    from fx import inputs
+    prun(inputs.items(rble), options, pack=True,
+         max_chars=whole_number(options.get('--max-chars'), "--max-chars"),
+         max_args=whole_number(options.get('--max-args'), "--max-args"))
 
 
 # ---------------------------------------------------------------------------
 def iterate_command(options, arglist):
     """
-    Run a command once for each of a sequence of numbers.
-
-    Possible enhancements would be to handle low/high/step tuples, and
-    to handle an arbitrary comma delimited list of values.
+    Run a command once for each of a sequence of numbers. RANGE is as for
+    'fx count' (see fx.ranges), except that the high end of a range is left
+    out.
     """
-    (low, high) = options['RANGE'].split(':')
-    for idx in range(int(low), int(high)):
-        cmd = tbx.expand(re.sub('%', str(idx), options['COMMAND']))
-        psys(cmd, options)
+    from fx import ranges
+    prun(ranges.values(options['RANGE'], inclusive=False), options)
 
 
 # ---------------------------------------------------------------------------
@@ -110,21 +162,21 @@ def psys(cmd, options):
     dryrun & !quiet: Display the command without running it
     dryrun & quiet: Do nothing - no display, no run
     """
-    # print("psys: cmd = '%s', dryrun = %s, quiet = %s"
-    #       % (cmd, options.dryrun, options.quiet))
-    if options['-n']:
-        print("would do '%s'" % cmd)
-    elif options['-q']:
-        # os.system(cmd)
-        pipe = os.popen(cmd, 'r')
-        sys.stdout.write(pipe.read())
-        pipe.close()
-    else:
-        print(cmd)
-        # os.system(cmd)
-        pipe = os.popen(cmd, 'r')
-        sys.stdout.write(pipe.read())
-        pipe.close()
+    from fx import engine
+    for _ in engine.execute([cmd], options['-n'], options['-q']):
+        pass
+
+
+# ---------------------------------------------------------------------------
+def prun(items, options, **how):
+    """
+    Run options['COMMAND'] for each of items, subject to dryrun and quiet as
+    for psys(). *how* is passed on to fx.engine.run().
+    """
+    from fx import engine
+    for _ in engine.run(items, options['COMMAND'], options['-n'],
+                        options['-q'], **how):
+        pass
 
 
 # ---------------------------------------------------------------------------
@@ -132,23 +184,26 @@ def subst_command(options, arglist):
     """
     Run the command for each filename in arglist.
     """
-    for filename in arglist:
-        cmd = tbx.expand(re.sub('%', filename, options['COMMAND']))
-        psys(cmd, options)
+    prun(arglist, options)
 
 
 # ---------------------------------------------------------------------------
 def subst_rename(options, arglist):
     """
     Create and run a rename command based on a s/old/new/ expression.
+
+    The renames are planned in full first; see fx.rename.
     """
-    subst = options['SUBSTITUTION']
-    pieces = subst.split(subst[1])
-    for filename in arglist:
-        newname = re.sub(pieces[1], pieces[2], filename)
+    def show(filename, newname):
         print("rename %s %s" % (filename, newname))
-        if not options['-n']:
-            os.rename(filename, newname)
+
+    from fx import rename
+    renames = rename.plan(arglist, options['SUBSTITUTION'])
+    if options['-n']:
+        for (filename, newname) in renames.items():
+            show(filename, newname)
+    else:
+        rename.execute(renames, show)
 
 
 # ---------------------------------------------------------------------------
@@ -164,29 +219,70 @@ def usage():
 
 
 # ---------------------------------------------------------------------------
-def xargs_wrap(cmd, rble):
+def xargs_wrap(cmd, rble, max_chars=None, max_args=None, shell=True,
+               sep=None):
     """
     Do xargs wrapping to cmd, distributing args from file rble across
-    command lines.
-    """
-    def clean(nubbin):
-        return re.sub(r'\s*%(\s*)', r'\1', nubbin)
-
-    tcmd = cmd
-    rval = []
-    for line in rble:
-        for item in line.strip().split(" "):
-            tcmd = xw_sub(tcmd, item.strip())
-            pending = True
-            if 240 < len(tcmd):
-                tcmd = clean(tcmd)
-                rval.append(tcmd)
-                pending = False
-                tcmd = cmd
-    if pending:
-        tcmd = clean(tcmd)
-        rval.append(tcmd)
-    return(rval)
+    command lines, as pack() does.
+
+    Items are the whitespace separated words in rble unless *sep* says
+    they're separated by '\n' or '\0' (see fx.inputs).
+    """
+    from fx import inputs
+    return pack(cmd, inputs.items(rble, sep), max_chars, max_args, shell)
+
+
+# ---------------------------------------------------------------------------
+def pack(cmd, items, max_chars=None, max_args=None, shell=True):
+    """
+    Return an iterator over command lines made from cmd with as many of
+    *items* as will fit on each, in place of the '%' word or at the end.
+
+    Command lines are yielded one at a time as soon as each is full, so the
+    caller can start running them before items is exhausted and no more
+    than one pending command line is held here no matter how many items
+    there are.
+
+    A command line is full when adding another item would make it longer
+    than *max_chars* bytes (arg_max() by default) or when it holds
+    *max_args* items. An item too long to fit even by itself still gets a
+    command line of its own.
+
+    The template is compiled once, right away, so a ValueError for one that
+    can't be is raised here rather than when the first command line is
+    wanted. Each command line is put together in a single join, so the work
+    per item stays the same however long the command lines get.
+
+    If *shell* is False, argument lists for running without a shell are
+    yielded instead of command strings.
+    """
+    from fx import template
+    if shell:
+        tmpl = template.XargsTemplate(cmd)
+    else:
+        tmpl = template.XargsArgvTemplate(cmd)
+    return batches(tmpl, items, max_chars or arg_max(shell), max_args)
+
+
+# ---------------------------------------------------------------------------
+def batches(tmpl, items, max_chars, max_args=None):
+    """
+    Yield the command lines pack() makes from the compiled xargs template
+    *tmpl* and *items*
+    """
+    batch = []
+    size = tmpl.size
+    for item in items:
+        isize = tmpl.item_size(item)
+        if batch and (max_chars < size + isize or
+                      max_args and max_args <= len(batch)):
+            yield tmpl.render(batch)
+            batch = []
+            size = tmpl.size
+        batch.append(item)
+        size += isize
+    if batch:
+        yield tmpl.render(batch)
 
 
 # ---------------------------------------------------------------------------
@@ -206,13 +302,15 @@ def xw_sub(cmd, item):
         'foo % bar'  => 'foo <item1> <item2> ... <itemn> bar'
     """
     if '~' in cmd or '$' in cmd:
+        import tbx
         cmd = tbx.expand(cmd)
 
     if '%' in cmd:
+        import re
         [word] = re.findall(r"\S*%\S*", cmd)
-        stant = re.sub('%', item, word)
+        stant = word.replace('%', item)
         xp = "{} {}".format(stant, word)
-        rval = re.sub(word, xp, cmd)
+        rval = cmd.replace(word, xp)
     else:
         rval = cmd + " " + item
     return rval
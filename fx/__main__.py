@@ -1,101 +1,243 @@
 """
 Usage:
-    fx [-d] [-n] [-q] cmd COMMAND FILE ...
-    fx [-d] [-n] [-q] xargs COMMAND
-    fx [-d] [-n] [-q] count COMMAND -i RANGE
-    fx [-d] [-n] [-q] rename -e SUBSTITUTION FILE ...
+    fx [-d] [-n] [-q] [-j N] [options] cmd COMMAND FILE ...
+    fx [-d] [-n] [-q] [-j N] [-0] [options] xargs COMMAND
+    fx [-d] [-n] [-q] [-j N] [options] count COMMAND -i RANGE
+    fx [-d] [-n] [-q] [-j N] [-0] [options] rename -e SUBSTITUTION [FILE ...]
     fx [-d] version
 
 Options:
-    -d        debug -- run the python debugger
-    -n        dryrun -- just show what would happen
-    -q        quiet -- don't echo commands before running them
-    -e        SUBSTITUTION -- a substitute expression: s/foo/bar/
-    -i RANGE  <low number>:<high number>
+    -d             debug -- run the python debugger
+    -n             dryrun -- just show what would happen
+    -q             quiet -- don't echo commands before running them
+    -e             SUBSTITUTION -- a substitute expression: s/foo/bar/
+    -i RANGE       <low>:<high>[:<step>]; list several with |, combine with ,
+    -0             items on stdin are NUL separated (default: one per line
+                   for rename, separated by whitespace for xargs)
+    -L             xargs: each line on stdin is one item
+    -j N           jobs -- run up to N commands at once (default: # of CPUs);
+                   for rename, up to N directories at once (default: 1)
+    --no-shell     run commands directly rather than with /bin/sh
+    --group        with -j, show each command's output all in one piece
+    --keep-order   like --group, but in the order the commands were given
+    --coproc       feed commands to long-lived shells, one per job
+    --asyncio      run commands from an event loop rather than threads
+    --timeout SECS  stop any command still running after SECS seconds
+    --max-load N   run fewer commands at once while the load is over N
+    --min-free-mem SIZE  likewise while less memory than SIZE (e.g. 2G) is
+                   available
+    --stats        report on where the time went to stderr when done
+    --stats-json FILE  write the --stats numbers to FILE as JSON
+    --trace FILE   write a timeline of the jobs to FILE for Perfetto
+    --profile FILE  profile fx itself into FILE (pstats, or stacks if .folded)
+    --pack         count: put as many values on each command line as fit
+    --max-args N   xargs, --pack: put at most N items on each command line
+    --max-chars N  xargs, --pack: keep command lines to N bytes
+                   (default: ARG_MAX)
+    --format FMT   count: write numbers with printf-style FMT, e.g. %04d
+    --incremental FILE  cmd: skip files unchanged since their command last
+                   succeeded, as recorded in FILE
+    --checksum     with --incremental, tell changed files by their contents
+    --journal FILE  add each command and its exit status to FILE
+    --resume FILE  skip commands FILE says succeeded, then add to it
 """
 
 
-from docopt_dispatch import dispatch
-from fx import xw_sub
+from fx.cli import dispatch
+from fx import prof
 from fx import version
+import fx
 import os
-import pdb
-import re
 import sys
-import tbx
+
+# The rest of fx (and asyncio, sqlite3, tbx...) is imported by the handlers
+# that need it, so that fx starts quickly whatever it's asked to do
+
+# The commands that run commands, as opposed to renaming files
+RUNNERS = {'cmd': None, 'xargs': None, 'count': None}
+
+# Options only some commands have, and what each needs given with it
+APPLIES = [
+    ('--no-shell', 'no_shell', RUNNERS),
+    ('--group', 'group', RUNNERS),
+    ('--keep-order', 'keep_order', RUNNERS),
+    ('--coproc', 'coproc', RUNNERS),
+    ('--asyncio', 'asyncio', RUNNERS),
+    ('--timeout', 'timeout', RUNNERS),
+    ('--max-load', 'max_load', RUNNERS),
+    ('--min-free-mem', 'min_free_mem', RUNNERS),
+    ('--stats', 'stats', RUNNERS),
+    ('--stats-json', 'stats_json', RUNNERS),
+    ('--trace', 'trace', RUNNERS),
+    ('--journal', 'journal', RUNNERS),
+    ('--resume', 'resume', RUNNERS),
+    ('--incremental', 'incremental', {'cmd': None}),
+    ('--checksum', 'checksum', {'cmd': 'incremental'}),
+    ('--pack', 'pack', {'count': None}),
+    ('--format', 'format', {'count': None}),
+    ('-L', 'L', {'xargs': None}),
+    ('--max-args', 'max_args', {'xargs': None, 'count': 'pack'}),
+    ('--max-chars', 'max_chars', {'xargs': None, 'count': 'pack'}),
+    ]
 
 
 # -----------------------------------------------------------------------------
 @dispatch.on('cmd')
+@prof.profiled
 def fx_cmd(**kw):
     """
     Run the command for each filename in arglist.
+
+    With --incremental, files whose size, mtime (or with --checksum,
+    contents) and command are the same as when the command last succeeded
+    on them are skipped. What's been done is kept in the --incremental file.
     """
+    from fx import engine
     if kw['d']:
-        pdb.set_trace()
-    cmd_t = kw['COMMAND']
-    (dryrun, quiet) = (kw['n'], kw['q'])
-    for filename in kw['FILE']:
-        cmd = tbx.expand(re.sub('%', filename, cmd_t))
-        dq_run(cmd, dryrun, quiet)
+        debug()
+    applies(kw, 'cmd')
+    try:
+        cmds = engine.commands(kw['FILE'], kw['COMMAND'], not kw['no_shell'])
+    except ValueError as err:
+        sys.exit("fx cmd: {}".format(err))
+    if not kw['incremental']:
+        sys.exit(dq_run(cmds, kw))
+
+    # sqlite3 is slow to import, so fx.index is only loaded when it's used
+    from fx import index
+    from fx import pool
+
+    started = {}
+
+    def stale_cmds():
+        for (filename, cmd) in zip(kw['FILE'], cmds):
+            stamp = files.stale(filename, cmd)
+            if stamp is not None:
+                started.setdefault(pool.cmdline(cmd), []).append(
+                    (filename, stamp))
+                yield cmd
+
+    def finished(result):
+        key = pool.cmdline(result.cmd)
+        (filename, stamp) = started[key].pop(0)
+        if not started[key]:
+            del started[key]
+        if result.status == 0 and not kw['n']:
+            files.record(filename, result.cmd, stamp)
+
+    files = index.Index(kw['incremental'], kw['checksum'])
+    try:
+        rval = dq_run(stale_cmds(), kw, finished)
+    finally:
+        files.close()
+    sys.exit(rval)
 
 
 # -----------------------------------------------------------------------------
 @dispatch.on('count')
+@prof.profiled
 def fx_count(**kw):
     """
     Run a command once for each of a sequence of numbers.
 
-    Possible enhancements would be to handle low/high/step tuples, and
-    to handle an arbitrary comma delimited list of values.
+    RANGE may give a step (low:high:step), list values and ranges separated
+    by '|', and combine several such lists separated by commas; see
+    fx.ranges. Values are generated as they're needed, so RANGE can be as
+    big as you like. Numbers are written with --format, e.g. '%04d'.
+
+    With --pack, values are put as many to a command line as will fit, in
+    place of the '%' word or at the end, just as 'fx xargs' does with
+    the items on stdin.
     """
+    from fx import engine
+    from fx import ranges
     if kw['d']:
-        pdb.set_trace()
-    cmd_t = kw['COMMAND']
-    (dryrun, quiet) = (kw['n'], kw['q'])
-    (low, high) = kw['i'].split(':')
-    for num in range(int(low), int(high)+1):
-        cmd = tbx.expand(re.sub('%', str(num), cmd_t))
-        dq_run(cmd, dryrun, quiet)
+        debug()
+    applies(kw, 'count')
+    (max_chars, max_args) = xargs_limits(kw)
+    try:
+        values = ranges.values(kw['i'], kw['format'] or "%d")
+        cmds = engine.commands(values, kw['COMMAND'], not kw['no_shell'],
+                               kw['pack'], max_chars, max_args)
+    except ValueError as err:
+        sys.exit("fx count: {}".format(err))
+    sys.exit(dq_run(cmds, kw))
 
 
 # -----------------------------------------------------------------------------
 @dispatch.on('rename')
+@prof.profiled
 def fx_rename(**kw):
     """
     Create and run a rename command based on a s/old/new/ expression.
+
+    All the new names are worked out before any file is renamed, so
+    collisions are reported without touching anything and swaps work. With
+    -j, that many directories are worked on at once.
+
+    With no FILE arguments, names are read from stdin, one per line or NUL
+    separated with -0, and planned a chunk at a time (see
+    fx.rename.plan_stream()). Every chunk is checked before any file is
+    renamed, but the checking keeps about 90 bytes per name in memory, and
+    renames that depend on each other are only put in order within a chunk.
     """
+    from fx import inputs
+    from fx import rename
+
+    def announce(filename, newname):
+        print("renaming {} -> {}".format(filename, newname))
+
     if kw['d']:
-        pdb.set_trace()
-    subst = kw['SUBSTITUTION']
+        debug()
+    applies(kw, 'rename')
     (dryrun, quiet) = (kw['n'], kw['q'])
-    pieces = subst.split(subst[1])
-    for filename in kw['FILE']:
-        newname = re.sub(pieces[1], pieces[2], filename)
-        if dryrun:
-            print("would rename {} to {}".format(filename, newname))
-        elif quiet:
-            os.rename(filename, newname)
+    jobs = fx.whole_number(kw['j'], "-j", 1)
+    subst = kw['SUBSTITUTION']
+    try:
+        if kw['FILE']:
+            plans = [rename.plan(kw['FILE'], subst)]
         else:
-            print("renaming {} -> {}".format(filename, newname))
-            os.rename(filename, newname)
+            names = inputs.split(sys.stdin, '\0' if kw['0'] else '\n')
+            plans = rename.plan_stream(names, subst)
+        for renames in plans:
+            if dryrun:
+                for (filename, newname) in renames.items():
+                    print("would rename {} to {}".format(filename, newname))
+            elif quiet:
+                rename.execute(renames, jobs=jobs)
+            else:
+                rename.execute(renames, announce, jobs)
+    except rename.RenameError as err:
+        sys.exit("fx rename: {}".format(err))
 
 
 # -----------------------------------------------------------------------------
 @dispatch.on('xargs')
+@prof.profiled
 def fx_xargs(**kw):
     """
     Bundle arguments into command lines similarly to xargs.
 
     Unlike xargs, this version allows for static values following the
-    list of arguments on each command line.
+    list of arguments on each command line. Command lines are made as long
+    as the system allows unless --max-chars or --max-args says otherwise.
+
+    Items on stdin are separated by whitespace, or with -0 by NULs, or with
+    -L by newlines.
     """
+    from fx import engine
+    from fx import inputs
     if kw['d']:
-        pdb.set_trace()
-    (dryrun, quiet) = (kw['n'], kw['q'])
-    cmd_t = kw['COMMAND']
-    for cmd in xargs_wrap(cmd_t):
-        dq_run(cmd, dryrun, quiet)
+        debug()
+    applies(kw, 'xargs')
+    (max_chars, max_args) = xargs_limits(kw)
+    sep = '\0' if kw['0'] else '\n' if kw['L'] else None
+    try:
+        cmds = engine.commands(inputs.items(sys.stdin, sep), kw['COMMAND'],
+                               not kw['no_shell'], True, max_chars, max_args)
+    except ValueError as err:
+        sys.exit("fx xargs: {}".format(err))
+    sys.exit(dq_run(cmds, kw))
 
 
 # -----------------------------------------------------------------------------
@@ -105,56 +247,170 @@ def fx_version(**kw):
     Report the current fx version
     """
     if kw['d']:
-        pdb.set_trace()
+        debug()
     print("fx {}".format(version.__version__))
 
 
 # -----------------------------------------------------------------------------
-def dq_run(cmd, dryrun, quiet):
+def debug():
+    """
+    Drop into the debugger where this was called from. pdb is only imported
+    here, since it's slow to import and rarely wanted.
     """
-    Handle a command subject to the dryrun and quiet members of options.
+    import pdb
+    pdb.Pdb().set_trace(sys._getframe(1))
+
+
+# -----------------------------------------------------------------------------
+def applies(kw, command):
+    """
+    Exit with a usage message if an option in *kw* is one *command* doesn't
+    have, or needs another option that wasn't given (see APPLIES)
+    """
+    for (option, key, commands) in APPLIES:
+        if not kw[key]:
+            continue
+        if command not in commands:
+            names = list(commands)
+            if 1 < len(names):
+                names[-2:] = [" and ".join(names[-2:])]
+            sys.exit("fx {}: {} only applies to {}"
+                     .format(command, option, ", ".join(names)))
+        needs = commands[command]
+        if needs and not kw[needs]:
+            sys.exit("fx {}: {} only applies with --{}"
+                     .format(command, option, needs))
+
+
+# -----------------------------------------------------------------------------
+def xargs_limits(kw):
+    """
+    The --max-chars and --max-args limits, None where not given. Exit
+    with a usage message if either isn't a whole number of at least 1.
+    """
+    return (fx.whole_number(kw['max_chars'], "--max-chars"),
+            fx.whole_number(kw['max_args'], "--max-args"))
+
+
+# -----------------------------------------------------------------------------
+def dq_run(cmds, kw, finished=None):
+    """
+    Handle commands subject to the dryrun, quiet, and jobs options in kw,
+    running them with fx.engine.execute().
 
     !dryrun & !quiet: display cmd then run
     !dryrun & quiet:  run without displaying first
     dryrun & !quiet:  display cmd without running it
     dryrun & quiet:   do nothing -- no display, no run
+
+    Up to -j commands are run at once. With --group or --keep-order, their
+    outputs are kept apart. With --coproc, they're run by long-lived shells.
+    If given, finished(result) is called as each command finishes. The
+    return value is suitable for sys.exit(): 0 if every command succeeded,
+    1 if any of them failed.
+
+    With --journal, each command and its exit status is added to a journal
+    as it finishes. --resume does the same, but first skips the commands
+    the journal says have already succeeded.
+
+    With --asyncio or --timeout, the commands are run from an event loop
+    (see fx.aio) rather than by threads, and any still going after
+    --timeout seconds are stopped.
+
+    With --max-load or --min-free-mem, fewer than -j commands are run at
+    once while the load average is higher or less memory is available than
+    that (see fx.adapt).
+
+    --stats reports on where the time went (see fx.stats) to stderr at the
+    end, and --stats-json writes the same numbers to a file. --trace
+    writes a timeline of the jobs that Perfetto can show (see fx.timeline).
+    The files for these and --journal are checked before anything's run.
+    """
+    from fx import adapt
+    from fx import engine
+    from fx import pool
+    from fx import stats
+    jobs = fx.whole_number(kw['j'], "-j", pool.cpu_count())
+    try:
+        timeout = float(kw['timeout']) if kw['timeout'] else None
+    except ValueError:
+        timeout = -1.0
+    if timeout is not None and not 0 < timeout:
+        sys.exit("fx: --timeout must be a number of seconds more than 0, "
+                 "not {}".format(kw['timeout']))
+    if kw['coproc'] and (kw['asyncio'] or timeout):
+        sys.exit("--coproc can't be used with --asyncio or --timeout")
+    try:
+        max_load = float(kw['max_load']) if kw['max_load'] else None
+    except ValueError:
+        max_load = -1.0
+    if max_load is not None and not 0 <= max_load < float('inf'):
+        sys.exit("fx: --max-load must be a load average, a number at least "
+                 "0, not {}".format(kw['max_load']))
+    try:
+        min_free = adapt.size(kw['min_free_mem']) \
+            if kw['min_free_mem'] else None
+    except ValueError as err:
+        sys.exit("fx: {}".format(err))
+    for option in ('journal', 'resume', 'trace', 'stats_json'):
+        if kw[option]:
+            writable(kw[option], "--" + option.replace("_", "-"))
+    results = engine.execute(cmds, kw['n'], kw['q'], jobs, group=kw['group'],
+                             keep_order=kw['keep_order'],
+                             coproc=kw['coproc'], asyncio=kw['asyncio'],
+                             timeout=timeout, journal=kw['journal'],
+                             resume=kw['resume'], trace=kw['trace'],
+                             max_load=max_load, min_free=min_free)
+    tally = stats.Stats() if kw['stats'] or kw['stats_json'] else None
+    rval = 0
+    try:
+        for result in results:
+            if tally:
+                tally.add(result)
+            if finished:
+                finished(result)
+            if result.status != 0:
+                rval = 1
+    finally:
+        results.close()
+    if tally:
+        tally.finish()
+        summary = tally.summary()
+        if kw['stats']:
+            print("\n".join(stats.text(summary)), file=sys.stderr)
+        if kw['stats_json']:
+            try:
+                stats.write_json(summary, kw['stats_json'])
+            except OSError as err:
+                print("fx: --stats-json {}: {}"
+                      .format(kw['stats_json'], err.strerror),
+                      file=sys.stderr)
+                rval = 1
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def writable(path, option):
+    """
+    Exit with a usage message if the file *path*, given for *option*, can't
+    be written (or, if it's there, read) -- before running anything, rather
+    than finding out part way through or at the end
     """
-    if dryrun:
-        print("would do '{}'".format(cmd))
-    elif quiet:
-        result = tbx.run(cmd)
-        print(result.rstrip())
+    if os.path.lexists(path):
+        problem = None
+        if os.path.isdir(path):
+            problem = "is a directory"
+        elif not os.access(path, os.R_OK | os.W_OK):
+            problem = "permission denied"
     else:
-        print(cmd)
-        result = tbx.run(cmd)
-        print(result.rstrip())
-
-
-# ---------------------------------------------------------------------------
-def xargs_wrap(cmd, rble=None):
-    """
-    Do xargs wrapping to cmd, distributing args from file rble across
-    command lines.
-    """
-    def clean(nubbin):
-        return re.sub(r'\s*%(\s*)', r'\1', nubbin)
-
-    rble = rble or sys.stdin
-    tcmd = cmd
-    rval = []
-    for line in rble:
-        for item in line.strip().split(" "):
-            tcmd = xw_sub(tcmd, item.strip())
-            pending = True
-            if 240 < len(tcmd):
-                tcmd = clean(tcmd)
-                rval.append(tcmd)
-                pending = False
-                tcmd = cmd
-    if pending:
-        tcmd = clean(tcmd)
-        rval.append(tcmd)
-    return(rval)
+        parent = os.path.dirname(path) or "."
+        problem = "no such directory"
+        if os.path.isdir(parent):
+            problem = None
+            if not os.access(parent, os.W_OK | os.X_OK):
+                problem = "permission denied"
+    if problem:
+        sys.exit("fx: {} {}: {}".format(option, path, problem))
 
 
 # -----------------------------------------------------------------------------
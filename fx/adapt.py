@@ -0,0 +1,159 @@
+"""
+Running fewer commands at once when the machine is busy, for --max-load
+and --min-free-mem
+
+On a shared host, -j alone either leaves the machine idle or, when others
+are busy too, pushes it into swap. A Governor watches how busy the machine
+is and tells fx.pool and fx.aio how many commands they may have going at
+once right now, between 1 and -j:
+
+  - with --max-load, the 1-minute load average and, where the kernel keeps
+    them (Linux 4.20 and later), the CPU and I/O pressure stall figures in
+    /proc/pressure;
+  - with --min-free-mem, the memory available according to /proc/meminfo
+    and the memory pressure stall figure.
+
+It looks again every INTERVAL seconds. A load average over --max-load means
+that many processes too many want to run, so the limit drops to -j less the
+excess. (It isn't taken off the current limit: the load average lags by a
+minute, so that would keep taking it off long after enough had been.) Too
+little memory, or PRESSURE percent or more of the last ten seconds spent
+with work stalled on something, says there's too much going on without
+saying how much, so the limit is halved. Otherwise it goes back up by one.
+Commands already running are left alone; the limit only holds back new
+ones.
+"""
+import math
+import os
+import time
+
+
+# Seconds between looks at how busy the machine is
+INTERVAL = 1.0
+
+# Percentage of time stalled ('some avg10' in /proc/pressure) taken to mean
+# the machine is overloaded
+PRESSURE = 40.0
+
+# Multipliers for the suffixes size() understands
+UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+# -----------------------------------------------------------------------------
+class Governor(object):
+    """
+    How many of up to *jobs* commands may run at once, given *max_load* (a
+    load average) and *min_free* (bytes of memory to leave available).
+    Either may be None to not watch it.
+    """
+    def __init__(self, jobs, max_load=None, min_free=None):
+        self.jobs = jobs
+        self.max_load = max_load
+        self.min_free = min_free
+        self.interval = INTERVAL
+        self.current = jobs
+        self.checked = None
+
+    def limit(self):
+        """
+        The number of commands that may be running now
+        """
+        now = time.monotonic()
+        if self.checked is None or self.interval <= now - self.checked:
+            self.checked = now
+            self.current = self.adjust(self.current)
+        return self.current
+
+    def adjust(self, current):
+        """
+        The limit to follow *current*, given how busy the machine is
+        """
+        if self.max_load is not None:
+            load = loadavg()
+            if load is not None and self.max_load < load:
+                excess = math.ceil(load - self.max_load)
+                return max(1, min(current, self.jobs - excess))
+            if PRESSURE <= max(pressure('cpu'), pressure('io')):
+                return max(1, current // 2)
+        if self.min_free is not None:
+            free = available()
+            if free is not None and free < self.min_free or \
+                    PRESSURE <= pressure('memory'):
+                return max(1, current // 2)
+        return min(self.jobs, current + 1)
+
+
+# -----------------------------------------------------------------------------
+def loadavg():
+    """
+    The 1-minute load average, or None if there isn't one
+    """
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+
+
+# -----------------------------------------------------------------------------
+def available(path="/proc/meminfo"):
+    """
+    Bytes of memory available for new work without swapping, or None if
+    that can't be found out
+    """
+    fields = {}
+    try:
+        with open(path) as rbl:
+            for line in rbl:
+                (name, _, value) = line.partition(":")
+                fields[name] = int(value.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        fields = {}
+    if 'MemAvailable' in fields:
+        return fields['MemAvailable']
+    if 'MemFree' in fields:
+        return sum(fields.get(name, 0)
+                   for name in ('MemFree', 'Buffers', 'Cached'))
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+# -----------------------------------------------------------------------------
+def pressure(resource, where="/proc/pressure"):
+    """
+    The percentage of the last ten seconds in which some task was stalled
+    waiting for *resource* ('cpu', 'io' or 'memory'), or 0.0 if the kernel
+    doesn't say
+    """
+    try:
+        with open(os.path.join(where, resource)) as rbl:
+            for line in rbl:
+                if line.startswith("some "):
+                    for field in line.split()[1:]:
+                        (name, _, value) = field.partition("=")
+                        if name == "avg10":
+                            return float(value)
+    except (OSError, ValueError):
+        pass
+    return 0.0
+
+
+# -----------------------------------------------------------------------------
+def size(text):
+    """
+    The number of bytes in *text*, e.g. '1500', '512M' or '2g'. Raise
+    ValueError if it isn't a size.
+    """
+    number = text.strip().upper()
+    scale = 1
+    if number[-1:] in UNITS:
+        (number, scale) = (number[:-1], UNITS[number[-1]])
+    try:
+        value = float(number)
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise ValueError("{} is not a size like 1500, 512M or 2G"
+                         .format(text))
+    return int(value * scale)
@@ -0,0 +1,227 @@
+"""
+Run the commands fx generates from an asyncio event loop
+
+This does what fx.pool does, but with the event loop watching every command
+rather than a thread per running command, so thousands of commands can be
+kept going at once. The loop learns that a command has finished from a
+pidfd where the kernel has them (Linux 5.3 and later). Python 3.12 and
+later do that by default; before that, asyncio's default is still a thread
+per command waiting for it to exit, so run() puts a PidfdChildWatcher in
+its place. Where pidfds can't be had, the thread per command remains.
+
+It also puts a time limit on each command: one still running *timeout*
+seconds after it started is sent SIGTERM, and SIGKILL if it hasn't gone
+GRACE seconds later.
+
+Each command is started in a session of its own, so the signals reach
+everything it started too, not just the shell. That also means a Ctrl-C at
+the terminal reaches fx alone, which stops every running command the same
+way before passing the KeyboardInterrupt on.
+
+run() is a plain generator, like pool.run(), that runs the event loop
+whenever it needs the next Result, so callers needn't know about asyncio.
+The event loop reaps the commands itself, so their Results don't carry
+their resource usage.
+"""
+from fx import pool
+import asyncio
+import collections
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# Seconds between SIGTERM and SIGKILL for a command being stopped
+GRACE = 5.0
+
+
+# -----------------------------------------------------------------------------
+def run(cmds, dryrun=False, quiet=False, jobs=1, group=False,
+        keep_order=False, timeout=None, governor=None):
+    """
+    Run each command in *cmds*, keeping up to *jobs* of them going at once,
+    and yield a Result for each one as it finishes. The arguments are as for
+    pool.run(), plus *timeout*, the number of seconds a command is given to
+    finish (None for no limit).
+    """
+    if dryrun:
+        for result in pool.run(cmds, dryrun=True):
+            yield result
+        return
+    spool = 1 < jobs and (group or keep_order) or pool.stdout_fd() is None
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    watcher = pidfd_watcher(loop)
+    sem = loop.run_until_complete(semaphore(jobs))
+    slots = list(range(jobs, 0, -1))
+    pending = collections.deque() if keep_order else set()
+    (window, every) = (lambda: 2 * jobs, None)
+    if governor:
+        (window, every) = (governor.limit, governor.interval)
+    try:
+        for cmd in cmds:
+            while window() <= len(pending):
+                for result in collect(loop, pending, keep_order, every):
+                    yield result
+            task = loop.create_task(execute(cmd, sem, quiet, spool, timeout,
+                                            slots, time.monotonic()))
+            if keep_order:
+                pending.append(task)
+            else:
+                pending.add(task)
+        while pending:
+            for result in collect(loop, pending, keep_order):
+                yield result
+    finally:
+        if pending:
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending,
+                                                   return_exceptions=True))
+        if watcher:
+            asyncio.set_child_watcher(None)
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+# -----------------------------------------------------------------------------
+def pidfd_watcher(loop):
+    """
+    On a Python older than 3.12, where the kernel supports pidfds, have
+    *loop* learn of its commands finishing from them and return the watcher
+    that does it (for run() to remove afterwards). Otherwise leave asyncio's
+    default alone and return None.
+    """
+    if (3, 12) <= sys.version_info or \
+            not hasattr(asyncio, 'PidfdChildWatcher'):
+        return None
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        return None
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(loop)
+    asyncio.set_child_watcher(watcher)
+    return watcher
+
+
+# -----------------------------------------------------------------------------
+def collect(loop, pending, keep_order, timeout=None):
+    """
+    Run the event loop until the next command is done (the first one in
+    *pending*, with *keep_order*), or *timeout* seconds have gone by, and
+    return a list of the Results of the commands that are, removing them
+    from *pending*
+    """
+    if keep_order:
+        task = pending[0]
+        loop.run_until_complete(asyncio.wait([task], timeout=timeout))
+        if not task.done():
+            return []
+        pending.popleft()
+        return [pool.finish(task.result())]
+    (done, _) = loop.run_until_complete(
+        asyncio.wait(pending, timeout=timeout,
+                     return_when=asyncio.FIRST_COMPLETED))
+    pending.difference_update(done)
+    return [pool.finish(task.result()) for task in done]
+
+
+# -----------------------------------------------------------------------------
+async def semaphore(count):
+    """
+    A semaphore belonging to the running event loop
+    """
+    return asyncio.Semaphore(count)
+
+
+# -----------------------------------------------------------------------------
+async def execute(cmd, sem, quiet=True, spool=False, timeout=None,
+                  slots=None, queued=None):
+    """
+    Once *sem* lets it, run *cmd* as pool.execute() would and return a
+    Result, stopping the command if it runs longer than *timeout* seconds
+    or this task is cancelled. While it runs, the command holds one of the
+    numbers in the list *slots*, which goes in the Result as its worker.
+    """
+    async with sem:
+        out = None
+        if spool:
+            out = tempfile.TemporaryFile()
+            if not quiet:
+                out.write("{}\n".format(pool.cmdline(cmd)).encode())
+                out.flush()
+        else:
+            if not quiet:
+                sys.stdout.write(pool.cmdline(cmd) + "\n")
+            sys.stdout.flush()
+        result = pool.Result(cmd, spool=out, start=time.monotonic())
+        result.queued = queued or result.start
+        if slots:
+            result.worker = slots.pop()
+        try:
+            result.status = await wait(result, timeout)
+        finally:
+            result.end = time.monotonic()
+            if slots is not None and result.worker is not None:
+                slots.append(result.worker)
+        return result
+
+
+# -----------------------------------------------------------------------------
+async def wait(result, timeout):
+    """
+    Start the command in *result* and return its exit status
+    """
+    cmd = result.cmd
+    try:
+        proc = await spawn(cmd, result.spool)
+    except OSError as err:
+        print("fx: {}: {}".format(pool.program(cmd), err.strerror),
+              file=sys.stderr)
+        return 127
+    result.running = time.monotonic()
+    result.spawned = 1
+    try:
+        return await asyncio.wait_for(proc.wait(), timeout)
+    except asyncio.TimeoutError:
+        print("fx: timed out after {}s: {}"
+              .format(timeout, pool.cmdline(cmd)), file=sys.stderr)
+        return await stop(proc)
+    except asyncio.CancelledError:
+        await stop(proc)
+        raise
+
+
+# -----------------------------------------------------------------------------
+async def spawn(cmd, out):
+    """
+    Start *cmd* in a session of its own, with its stdout going to *out*
+    (or fx's own stdout if *out* is None)
+    """
+    if isinstance(cmd, str):
+        return await asyncio.create_subprocess_shell(
+            cmd, stdin=subprocess.DEVNULL, stdout=out, start_new_session=True)
+    return await asyncio.create_subprocess_exec(
+        *cmd, stdin=subprocess.DEVNULL, stdout=out, start_new_session=True)
+
+
+# -----------------------------------------------------------------------------
+async def stop(proc):
+    """
+    Send SIGTERM to *proc*'s process group, then SIGKILL if it hasn't
+    finished within GRACE seconds, and return its exit status
+    """
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            pass
+        try:
+            return await asyncio.wait_for(proc.wait(), GRACE)
+        except asyncio.TimeoutError:
+            pass
+    return await proc.wait()
@@ -0,0 +1,250 @@
+"""
+Benchmarks for fx's hot paths
+
+Run as 'python -m fx.bench'.
+
+Usage:
+    fx.bench [--quick] [--save FILE] [--baseline FILE]
+             [--tolerance PCT] [NAME ...]
+    fx.bench --child NAME SCALE
+
+Options:
+    --quick          run each benchmark at a hundredth of its usual size
+    --save FILE      save the results to FILE as a baseline for later runs
+    --baseline FILE  compare the results with those saved in FILE
+    --tolerance PCT  how much slower than the baseline is too slow
+                     [default: 20]
+    --child          (internal) run one benchmark and report on stdout
+
+Each benchmark (all of them, or the NAMEs given) runs synthetic work through
+one of fx's hot paths and reports how many items per second it got through
+and the peak resident set size of the process that ran it. Every benchmark
+runs in a fresh Python process so that none of them inherits another's
+memory high-water mark.
+
+    xargs    a million items from a stdin-like file through xargs_wrap()
+    xw_sub   xw_sub() building up a command line an item at a time
+    rename   planning and carrying out 100k renames in a temporary directory
+    spawn    10k no-op commands run by pool.run()
+
+With --baseline, each result is shown against the saved one, and the exit
+status is 1 if any benchmark ran more than --tolerance percent slower.
+
+xargs_batching() also reports how long xargs_wrap() spends on each item as
+the command lines it builds grow from a few kilobytes up to ARG_MAX size.
+The cost per item should stay flat; if it climbs with the line length,
+batching has gone quadratic again.
+"""
+from fx import pool
+from fx import rename
+import fx
+import io
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# -----------------------------------------------------------------------------
+def xargs_batching(count=200000, limits=(4096, 32768, 131071)):
+    """
+    Feed *count* items through xargs_wrap() once for each line length in
+    *limits* and return a list of (limit, command lines, usec per item)
+    """
+    data = "".join("item{}\n".format(idx) for idx in range(count))
+    rval = []
+    for limit in limits:
+        start = time.perf_counter()
+        lines = sum(1 for _ in fx.xargs_wrap("echo %", io.StringIO(data),
+                                             limit))
+        elapsed = time.perf_counter() - start
+        rval.append((limit, lines, 1e6 * elapsed / count))
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def bench_xargs(count=1000000):
+    """
+    Batch *count* items from a file into ARG_MAX sized command lines
+    """
+    data = "".join("item{}\n".format(idx) for idx in range(count))
+    rble = io.StringIO(data)
+    start = time.perf_counter()
+    for _ in fx.xargs_wrap("echo % end", rble, sep="\n"):
+        pass
+    return (count, time.perf_counter() - start)
+
+
+# -----------------------------------------------------------------------------
+def bench_xw_sub(count=3000):
+    """
+    Build a command line of *count* items with xw_sub(), the way the legacy
+    code did, one item at a time
+    """
+    cmd = "echo % end"
+    start = time.perf_counter()
+    for idx in range(count):
+        cmd = fx.xw_sub(cmd, "item{}".format(idx))
+    return (count, time.perf_counter() - start)
+
+
+# -----------------------------------------------------------------------------
+def bench_rename(count=100000):
+    """
+    Plan and carry out renames of *count* files in a temporary directory
+    """
+    where = tempfile.mkdtemp(prefix="fx-bench-")
+    try:
+        names = []
+        for idx in range(count):
+            name = os.path.join(where, "file{}".format(idx))
+            os.close(os.open(name, os.O_CREAT | os.O_WRONLY, 0o644))
+            names.append(name)
+        start = time.perf_counter()
+        rename.execute(rename.plan(names, "s/file/moved/"))
+        return (count, time.perf_counter() - start)
+    finally:
+        shutil.rmtree(where)
+
+
+# -----------------------------------------------------------------------------
+def bench_spawn(count=10000):
+    """
+    Run *count* no-op commands through pool.run(), as dq_run() does, with
+    as many jobs as there are CPUs
+    """
+    cmds = (["true"] for _ in range(count))
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    saved = os.dup(1)
+    os.dup2(devnull, 1)
+    try:
+        start = time.perf_counter()
+        for _ in pool.run(cmds, quiet=True, jobs=pool.cpu_count()):
+            pass
+        return (count, time.perf_counter() - start)
+    finally:
+        os.dup2(saved, 1)
+        os.close(saved)
+        os.close(devnull)
+
+
+# The benchmarks, by name
+BENCHMARKS = {
+    'xargs': bench_xargs,
+    'xw_sub': bench_xw_sub,
+    'rename': bench_rename,
+    'spawn': bench_spawn,
+}
+
+
+# -----------------------------------------------------------------------------
+def measure(name, scale=1.0):
+    """
+    Run benchmark *name* at *scale* times its usual size in a fresh process
+    and return a dict of its items, seconds, items/sec and peak RSS in KiB
+    """
+    out = subprocess.check_output([sys.executable, "-m", "fx.bench",
+                                   "--child", name, str(scale)],
+                                  universal_newlines=True)
+    return json.loads(out)
+
+
+# -----------------------------------------------------------------------------
+def child(name, scale):
+    """
+    Run benchmark *name* in this process and write its results to stdout
+    as JSON
+    """
+    func = BENCHMARKS[name]
+    default = func.__defaults__[0]
+    (items, seconds) = func(max(1, int(default * scale)))
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    rss = usage.ru_maxrss
+    if sys.platform == 'darwin':
+        rss //= 1024
+    json.dump({'items': items, 'seconds': seconds,
+               'rate': items / seconds if seconds else None,
+               'peak_rss_kb': rss}, sys.stdout)
+
+
+# -----------------------------------------------------------------------------
+def compare(results, baseline, tolerance=20.0):
+    """
+    Return (report lines, names of benchmarks more than *tolerance* percent
+    slower than in *baseline*)
+    """
+    lines = []
+    slow = []
+    for (name, result) in results.items():
+        base = baseline.get(name)
+        if not base or not base.get('rate') or not result['rate']:
+            lines.append("{:<8} no baseline".format(name))
+            continue
+        change = 100.0 * (result['rate'] / base['rate'] - 1)
+        flag = ""
+        if change < -tolerance:
+            slow.append(name)
+            flag = "  SLOWER"
+        lines.append("{:<8} {:>12.0f} items/sec vs {:>12.0f} ({:+.1f}%), "
+                     "peak RSS {} KiB vs {} KiB{}"
+                     .format(name, result['rate'], base['rate'], change,
+                             result['peak_rss_kb'], base.get('peak_rss_kb'),
+                             flag))
+    return (lines, slow)
+
+
+# -----------------------------------------------------------------------------
+def main(argv=None):
+    """
+    Run the benchmarks and report the results
+    """
+    import docopt
+    opts = docopt.docopt(__doc__, argv)
+    if opts['--child']:
+        child(opts['NAME'][0], float(opts['SCALE']))
+        return 0
+
+    names = opts['NAME'] or sorted(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        sys.exit("no such benchmark: {}".format(", ".join(unknown)))
+    scale = 0.01 if opts['--quick'] else 1.0
+
+    print("{:<8} {:>10} {:>10} {:>14} {:>12}".format(
+        "bench", "items", "seconds", "items/sec", "peak RSS KiB"))
+    results = {}
+    for name in names:
+        result = results[name] = measure(name, scale)
+        print("{:<8} {:>10} {:>10.3f} {:>14.0f} {:>12}".format(
+            name, result['items'], result['seconds'], result['rate'] or 0,
+            result['peak_rss_kb']))
+
+    print("xargs_wrap: {:>8} {:>8} {:>10}".format("max", "lines", "usec/item"))
+    count = 2000 if opts['--quick'] else 200000
+    for (limit, lines, usec) in xargs_batching(count):
+        print("            {:>8} {:>8} {:>10.3f}".format(limit, lines, usec))
+
+    if opts['--save']:
+        with open(opts['--save'], 'w') as wbl:
+            json.dump(results, wbl, indent=2, sort_keys=True)
+            wbl.write("\n")
+    if opts['--baseline']:
+        with open(opts['--baseline']) as rbl:
+            baseline = json.load(rbl)
+        (lines, slow) = compare(results, baseline,
+                                float(opts['--tolerance']))
+        print("")
+        for line in lines:
+            print(line)
+        if slow:
+            return 1
+    return 0
+
+
+# -----------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
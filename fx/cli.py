@@ -0,0 +1,322 @@
+"""
+Command line parsing for fx, without docopt
+
+docopt works out how to parse a command line from scratch every time fx
+starts: it builds a pattern tree out of the usage message with regular
+expressions and then searches it. That, and importing it, took longer than
+everything else fx does before running its first command. fx's usage
+message only ever has a handful of shapes in it, so this module reads it
+with a few string operations into flat tables and matches the command line
+against them directly.
+
+What's understood is the subset of docopt fx's usage message uses:
+
+  - an Options: section whose lines start with the option, followed by an
+    argument name if it takes one, then two or more spaces and a
+    description, which may hold '[default: value]';
+  - usage lines made of command words, ARGUMENTS, options (which are
+    required) and [bracketed] options, arguments, and '[options]', with
+    '...' after an argument that may be repeated.
+
+Options may come anywhere on the command line and be given as '-nq', '-j4',
+'--max-args=4', or any unambiguous prefix of a long option. Arguments are
+handed to the handler the way docopt_dispatch does it: as keywords with
+dashes stripped and other punctuation turned into '_'.
+
+test/test_cli.py checks this against docopt itself on fx's usage message.
+"""
+import sys
+
+
+# -----------------------------------------------------------------------------
+class Option(object):
+    """
+    An option from the Options: section
+    """
+    def __init__(self, names, argcount=0, default=None):
+        self.names = names
+        self.argcount = argcount
+        self.default = default if argcount else False
+
+    @property
+    def key(self):
+        """
+        The name the option goes by in the results: the long one if any
+        """
+        return self.names[-1]
+
+
+# -----------------------------------------------------------------------------
+class Pattern(object):
+    """
+    One usage line: the options allowed and required on it and its sequence
+    of command words and arguments
+    """
+    def __init__(self, line, options):
+        self.allowed = set()
+        self.required = set()
+        self.shortcut = False
+        self.words = []
+        tokens = line.split()[1:]
+        while tokens:
+            token = tokens.pop(0)
+            optional = token.startswith("[")
+            name = token.strip("[]")
+            if name == "...":
+                self.words[-1][2] = True
+            elif name == "options":
+                self.shortcut = True
+            elif name.startswith("-"):
+                option = options[name]
+                self.allowed.add(option.key)
+                if not optional:
+                    self.required.add(option.key)
+                if option.argcount:
+                    tokens.pop(0)
+            else:
+                kind = "arg" if name.isupper() else "cmd"
+                self.words.append([kind, name, False, optional])
+
+    def match(self, given, args):
+        """
+        Return a dict of the command words and arguments in *args* if they
+        and the options in *given* fit this pattern, else None
+        """
+        if not self.required.issubset(given):
+            return None
+        rval = {}
+        pos = 0
+        for (idx, (kind, name, repeat, optional)) in enumerate(self.words):
+            rest = len(args) - pos
+            need = sum(1 for word in self.words[idx + 1:] if not word[3])
+            if kind == "cmd":
+                if pos < len(args) and args[pos] == name:
+                    rval[name] = True
+                    pos += 1
+                elif not optional:
+                    return None
+            elif repeat:
+                take = rest - need
+                if take < (0 if optional else 1):
+                    return None
+                rval[name] = args[pos:pos + take]
+                pos += take
+            elif rest > need or (rest and not optional):
+                rval[name] = args[pos]
+                pos += 1
+            elif not optional:
+                return None
+        if pos != len(args):
+            return None
+        return rval
+
+
+# -----------------------------------------------------------------------------
+class Parser(object):
+    """
+    The tables read from a usage message
+    """
+    def __init__(self, doc):
+        self.doc = doc
+        self.usage = usage_section(doc)
+        self.options = {}
+        self.by_key = {}
+        for option in parse_options(doc):
+            self.by_key[option.key] = option
+            for name in option.names:
+                self.options[name] = option
+        self.patterns = [Pattern(line, self.options)
+                         for line in self.usage.split("\n")[1:]]
+        self.names = []
+        self.repeats = set()
+        self.explicit = set()
+        for pattern in self.patterns:
+            self.explicit |= pattern.allowed
+            for (_, name, repeat, _) in pattern.words:
+                if name not in self.names:
+                    self.names.append(name)
+                if repeat:
+                    self.repeats.add(name)
+
+    def parse(self, argv):
+        """
+        Return the dict docopt would for *argv*, or exit with the usage
+        message (and what went wrong) if it doesn't fit
+        """
+        given = {}
+        args = []
+        tokens = list(argv)
+        while tokens:
+            token = tokens.pop(0)
+            if token == "--":
+                # docopt keeps the '--' itself as an argument
+                args.extend([token] + tokens)
+                break
+            elif token.startswith("--"):
+                (name, eq, value) = token.partition("=")
+                option = self.long_option(name, eq)
+                if option.argcount and not eq:
+                    if not tokens:
+                        self.exit("{} requires argument".format(option.key))
+                    value = tokens.pop(0)
+                elif not option.argcount and eq:
+                    self.exit("{} must not have an argument"
+                              .format(option.key))
+                self.give(given, option, value if option.argcount else True)
+            elif token.startswith("-") and token != "-":
+                letters = token[1:]
+                while letters:
+                    name = "-" + letters[0]
+                    letters = letters[1:]
+                    option = self.options.get(name) or Option([name])
+                    value = True
+                    if option.argcount:
+                        if letters:
+                            (value, letters) = (letters, "")
+                        elif tokens:
+                            value = tokens.pop(0)
+                        else:
+                            self.exit("{} requires argument".format(name))
+                    self.give(given, option, value)
+            else:
+                args.append(token)
+        if "--help" in given or "-h" in given:
+            print(self.doc.strip("\n"))
+            sys.exit()
+        for pattern in self.patterns:
+            allowed = pattern.allowed
+            if pattern.shortcut:
+                allowed = allowed | (set(self.by_key) - self.explicit)
+            if not set(given).issubset(allowed):
+                continue
+            words = pattern.match(given, args)
+            if words is not None:
+                break
+        else:
+            self.exit()
+        rval = {key: option.default for (key, option) in self.by_key.items()}
+        for name in self.names:
+            if name in self.repeats:
+                rval[name] = []
+            else:
+                rval[name] = None if name.isupper() else False
+        rval.update(given)
+        rval.update(words)
+        return rval
+
+    def long_option(self, name, eq):
+        """
+        The option *name* is, or is an unambiguous prefix of. One that isn't
+        known is passed along (taking an argument if *eq*) for the usage
+        message to reject, unless it's --help.
+        """
+        if name in self.options:
+            return self.options[name]
+        found = [key for key in self.by_key
+                 if key.startswith(name) and key.startswith("--")]
+        if len(found) == 1:
+            return self.by_key[found[0]]
+        if found:
+            self.exit("{} is not a unique prefix: {}?"
+                      .format(name, ", ".join(found)))
+        return Option([name], 1 if eq else 0)
+
+    def give(self, given, option, value):
+        """
+        Note that *option* was given on the command line
+        """
+        if option.key in given:
+            self.exit()
+        given[option.key] = value
+
+    def exit(self, message=""):
+        """
+        Give up, showing what went wrong and the usage message
+        """
+        sys.exit((message + "\n" + self.usage).strip())
+
+
+# -----------------------------------------------------------------------------
+class Dispatch(object):
+    """
+    A drop-in for docopt_dispatch's dispatch: register handlers with
+    dispatch.on('word', ...) and call dispatch(__doc__)
+    """
+    def __init__(self):
+        self.handlers = []
+
+    def on(self, *words):
+        """
+        Register the decorated function to handle command lines on which
+        all of *words* are set
+        """
+        def decorator(func):
+            self.handlers.append((words, func))
+            return func
+        return decorator
+
+    def __call__(self, doc, argv=None):
+        """
+        Parse *argv* (the command line by default) per *doc* and call the
+        first handler whose words are all set
+        """
+        result = Parser(doc).parse(sys.argv[1:] if argv is None else argv)
+        for (words, func) in self.handlers:
+            if all(result[word] for word in words):
+                return func(**kwargify(result))
+        raise RuntimeError("no handler for {}".format(result))
+
+
+# The dispatcher for fx/__main__.py
+dispatch = Dispatch()
+
+
+# -----------------------------------------------------------------------------
+def kwargify(result):
+    """
+    *result* with its keys turned into keyword names, as docopt_dispatch
+    does: '--max-chars' becomes 'max_chars', '-0' becomes '0'
+    """
+    rval = {}
+    for (key, value) in result.items():
+        name = "".join(char if char.isalnum() else "_" for char in key)
+        rval[name.strip("_")] = value
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def usage_section(doc):
+    """
+    The 'Usage:' paragraph of *doc*
+    """
+    start = doc.lower().index("usage:")
+    rval = []
+    for line in doc[start:].split("\n"):
+        if not line.strip():
+            break
+        rval.append(line)
+    return "\n".join(rval).strip()
+
+
+# -----------------------------------------------------------------------------
+def parse_options(doc):
+    """
+    Yield an Option for each line of *doc*'s option descriptions
+    """
+    for line in doc.split("\n"):
+        line = line.strip()
+        if not line.startswith("-"):
+            continue
+        (spec, _, desc) = line.partition("  ")
+        names = []
+        argcount = 0
+        for part in spec.replace(",", " ").replace("=", " ").split():
+            if part.startswith("-"):
+                names.append(part)
+            else:
+                argcount = 1
+        default = None
+        if "[default: " in desc.lower():
+            at = desc.lower().index("[default: ") + len("[default: ")
+            default = desc[at:desc.index("]", at)]
+        yield Option(names, argcount, default)
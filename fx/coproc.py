@@ -0,0 +1,128 @@
+"""
+Long-lived shells to run short commands in
+
+Starting /bin/sh for every command costs far more than commands like touch,
+chmod or ln take to run. A Shell is started once and fed one command after
+another over a pipe. Each command is followed by a line carrying a random
+marker and the command's exit status, so its output can be picked out of
+the stream and passed along.
+
+Each command is handed to the shell quoted, as the argument of 'eval', so
+the shell always finishes reading it however it's written: an unbalanced
+quote or a heredoc can't make the shell read on into the marker line.
+
+Shell state carries over from one command to the next, with the exception
+of the working directory and stdout and stderr, which are put back after
+each command. A command that makes the shell exit (with 'exit' or a syntax
+error) fails with the shell's exit status and a fresh shell is started for
+the next one.
+"""
+import os
+import secrets
+import shlex
+import subprocess
+import threading
+
+
+# -----------------------------------------------------------------------------
+class Shell(object):
+    """
+    A /bin/sh process reading commands from a pipe
+    """
+    def __init__(self):
+        self.runs = 0
+        self.marker = "fx-{}".format(secrets.token_hex(16)).encode()
+        self.proc = subprocess.Popen(["/bin/sh"], stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, bufsize=0)
+        # fds 8 and 9 keep the shell's own stderr and stdout, for putting
+        # back after a command that 'exec's them somewhere else
+        self.proc.stdin.write(b"exec 9>&1 8>&2\n")
+        self.trailer = ("fx_rc=$?; exec >&9 2>&8; cd {} 2>/dev/null; "
+                        "printf '\\n%s %d\\n' {} $fx_rc\n"
+                        .format(shlex.quote(os.getcwd()),
+                                self.marker.decode())).encode()
+
+    def alive(self):
+        """
+        Whether the shell is still there to take commands
+        """
+        return self.proc.poll() is None
+
+    def run(self, cmd, out):
+        """
+        Run *cmd* in the shell, copying its output to file descriptor *out*
+        as it arrives, and return its exit status
+        """
+        self.runs += 1
+        script = ("{{ eval {}\n}} </dev/null 8>&- 9>&-\n"
+                  .format(shlex.quote(cmd)).encode() + self.trailer)
+        try:
+            self.proc.stdin.write(script)
+        except BrokenPipeError:
+            return self.proc.wait()
+        tag = b"\n" + self.marker + b" "
+        keep = len(tag) - 1
+        fd = self.proc.stdout.fileno()
+        buf = b""
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                write(out, buf)
+                return self.proc.wait()
+            buf += chunk
+            pos = buf.find(tag)
+            if 0 <= pos:
+                end = buf.find(b"\n", pos + len(tag))
+                if 0 <= end:
+                    write(out, buf[:pos])
+                    return int(buf[pos + len(tag):end])
+            elif keep < len(buf):
+                write(out, buf[:-keep])
+                buf = buf[-keep:]
+
+    def close(self):
+        """
+        Let the shell finish
+        """
+        self.proc.stdin.close()
+        self.proc.wait()
+        self.proc.stdout.close()
+
+
+# -----------------------------------------------------------------------------
+class Shells(object):
+    """
+    One Shell for each thread that asks for one
+    """
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.shells = []
+
+    def get(self):
+        """
+        The calling thread's Shell, started (or restarted) as needed
+        """
+        shell = getattr(self.local, 'shell', None)
+        if shell is None or not shell.alive():
+            shell = self.local.shell = Shell()
+            with self.lock:
+                self.shells.append(shell)
+        return shell
+
+    def close(self):
+        """
+        Let all the shells finish
+        """
+        for shell in self.shells:
+            shell.close()
+
+
+# -----------------------------------------------------------------------------
+def write(fd, data):
+    """
+    Write all of *data* to *fd*
+    """
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
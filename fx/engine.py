@@ -0,0 +1,132 @@
+"""
+Running commands the fx way, from the command line or from Python
+
+Both of fx's command lines -- 'python fx ...' (fx/__main__.py) and the
+older fx.main() -- run their commands through here, and so can any Python
+code that wants what fx does without starting fx to do it:
+
+    from fx import engine
+    for result in engine.run(filenames, "gzip %", jobs=4):
+        if result.status:
+            ...
+
+run() makes a command from a template for each item and hands them to
+execute(), which runs them with fx.pool (threads) or fx.aio (an event
+loop), keeps the --journal and writes the --trace. Both yield a pool.Result
+as each command finishes, and do nothing until asked for the first one, so
+items can come from a generator of any length.
+
+Where the output goes is as for fx.pool: to sys.stdout, straight from the
+commands if it's a real file and by way of a temporary file if not.
+"""
+import time
+
+
+# -----------------------------------------------------------------------------
+def run(items, command, dryrun=False, quiet=False, jobs=1, shell=True,
+        pack=False, max_chars=None, max_args=None, **how):
+    """
+    Run *command* for each of *items*, '%' in it standing for the item (see
+    fx.template), and return an iterator over a Result for each command as
+    it finishes.
+
+    With *pack*, items are put as many to a command line as fit, the way
+    'fx xargs' does it (see fx.pack()). If *shell* is False, commands are
+    run directly rather than with /bin/sh. *dryrun*, *quiet*, *jobs* and
+    the keywords in *how* are as for execute().
+    """
+    cmds = commands(items, command, shell, pack, max_chars, max_args)
+    return execute(cmds, dryrun, quiet, jobs, **how)
+
+
+# -----------------------------------------------------------------------------
+def commands(items, command, shell=True, pack=False, max_chars=None,
+             max_args=None):
+    """
+    Return an iterator over the commands run() would run for *items*. The
+    template is compiled once, up front, and ValueError is raised then if it
+    can't be (see fx.template).
+    """
+    from fx import template
+    if pack:
+        import fx
+        return fx.pack(command, items, max_chars, max_args, shell)
+    if shell:
+        tmpl = template.Template(command)
+    else:
+        tmpl = template.ArgvTemplate(command)
+    return (tmpl.render(item) for item in items)
+
+
+# -----------------------------------------------------------------------------
+def execute(cmds, dryrun=False, quiet=False, jobs=1, group=False,
+            keep_order=False, coproc=False, asyncio=False, timeout=None,
+            journal=None, resume=None, trace=None, max_load=None,
+            min_free=None):
+    """
+    Run the commands in *cmds* and return an iterator over a Result for
+    each one as it finishes. Raise ValueError right away if the options
+    don't go together.
+
+    *dryrun*, *quiet*, *jobs*, *group*, *keep_order* and *coproc* are as
+    for pool.run(). With *asyncio* or a *timeout* (in seconds), aio.run()
+    runs the commands instead, and coproc can't be used.
+
+    If *journal* names a file, each command and its exit status is added to
+    it as it finishes (not on a dryrun). *resume* does the same, but first
+    skips the commands its file says have already succeeded. If *trace*
+    names a file, a timeline of the commands is written to it (see
+    fx.timeline).
+
+    With *max_load* (a load average) or *min_free* (bytes of memory), fewer
+    than *jobs* commands are run at once while the machine is busier than
+    that (see fx.adapt).
+    """
+    from fx import journal as journals
+    if jobs < 1:
+        raise ValueError("jobs must be at least 1")
+    if coproc and (asyncio or timeout):
+        raise ValueError("coproc can't be used with asyncio or a timeout")
+    path = resume or journal
+    if resume:
+        cmds = journals.skip(cmds, journals.succeeded(path))
+    governor = None
+    if max_load is not None or min_free is not None:
+        from fx import adapt
+        governor = adapt.Governor(jobs, max_load, min_free)
+    if asyncio or timeout:
+        from fx import aio
+        results = aio.run(cmds, dryrun, quiet, jobs, group=group,
+                          keep_order=keep_order, timeout=timeout,
+                          governor=governor)
+    else:
+        from fx import pool
+        results = pool.run(cmds, dryrun, quiet, jobs, group=group,
+                           keep_order=keep_order, coproc=coproc,
+                           governor=governor)
+    return observe(results, None if dryrun else path, trace)
+
+
+# -----------------------------------------------------------------------------
+def observe(results, journal, trace):
+    """
+    Yield *results*, adding each to the *journal* and the *trace* files if
+    there are to be any. Nothing's opened until the first result is wanted.
+    """
+    from fx import journal as journals
+    from fx import timeline
+    origin = time.monotonic()
+    jnl = journals.Journal(journal) if journal else None
+    tracer = timeline.Timeline(trace, origin) if trace else None
+    try:
+        for result in results:
+            if jnl:
+                jnl.record(result)
+            if tracer:
+                tracer.add(result)
+            yield result
+    finally:
+        if jnl:
+            jnl.close()
+        if tracer:
+            tracer.close()
@@ -0,0 +1,119 @@
+"""
+A record of the files a command last succeeded on, for 'fx cmd --incremental'
+
+The index is a small SQLite database holding one row per file: its size,
+its modification time in nanoseconds, optionally a digest of its contents,
+and the command that was run on it. A file whose row still matches, and
+whose command hasn't changed, is up to date and can be skipped. Each lookup
+goes straight to the row by its primary key, so checking a file costs the
+same however many the index holds.
+
+By default a file counts as changed when its size or mtime differs from the
+one recorded. With checksum, a file whose size is the same but whose mtime
+isn't has its contents hashed, so a file that was merely touched or checked
+out again is still up to date.
+
+A file's stamp is taken before its command runs and recorded only once the
+command has succeeded, so a file changed while its command was running is
+seen as changed next time.
+"""
+import hashlib
+import os
+import sqlite3
+
+
+# Commit the records made so far every this many records
+BATCH = 1000
+
+
+# -----------------------------------------------------------------------------
+class Index(object):
+    """
+    The index of files in a database at *path*
+    """
+    def __init__(self, path, checksum=False):
+        self.checksum = checksum
+        self.db = sqlite3.connect(path)
+        self.db.execute("create table if not exists files"
+                        " (path blob primary key, size integer,"
+                        " mtime_ns integer, digest blob, cmd blob)")
+        self.pending = 0
+
+    def stale(self, path, cmd):
+        """
+        Return None if *path* is up to date with respect to *cmd*. Otherwise
+        return the stamp to record() for it once *cmd* has succeeded. A
+        file that can't be examined is always stale, and its stamp is False.
+        """
+        key = os.fsencode(os.path.abspath(path))
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        stamp = [stat.st_size, stat.st_mtime_ns, None]
+        row = self.db.execute("select size, mtime_ns, digest, cmd from files"
+                              " where path = ?", (key,)).fetchone()
+        if row is None:
+            if self.checksum:
+                stamp[2] = digest(path)
+            return stamp
+        (size, mtime_ns, old_digest, old_cmd) = row
+        same_cmd = old_cmd == encode(cmd)
+        if size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+            if same_cmd:
+                return None
+            stamp[2] = old_digest
+            return stamp
+        if self.checksum:
+            stamp[2] = digest(path)
+            if same_cmd and size == stat.st_size and stamp[2] == old_digest:
+                self.record(path, cmd, stamp)
+                return None
+        return stamp
+
+    def record(self, path, cmd, stamp):
+        """
+        Note that *cmd* succeeded on *path*, which looked like *stamp*
+        beforehand
+        """
+        if not stamp:
+            return
+        key = os.fsencode(os.path.abspath(path))
+        self.db.execute("insert or replace into files values (?, ?, ?, ?, ?)",
+                        (key, stamp[0], stamp[1], stamp[2], encode(cmd)))
+        self.pending += 1
+        if BATCH <= self.pending:
+            self.db.commit()
+            self.pending = 0
+
+    def close(self):
+        """
+        Commit whatever has been recorded and close the database
+        """
+        self.db.commit()
+        self.db.close()
+
+
+# -----------------------------------------------------------------------------
+def encode(cmd):
+    """
+    *cmd*, a command string or argument list, as bytes to store
+    """
+    if not isinstance(cmd, str):
+        cmd = "\0".join(cmd)
+    return os.fsencode(cmd)
+
+
+# -----------------------------------------------------------------------------
+def digest(path):
+    """
+    A digest of the contents of *path*, or None if it can't be read
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, 'rb') as rble:
+            for block in iter(lambda: rble.read(1 << 20), b""):
+                hasher.update(block)
+    except OSError:
+        return None
+    return hasher.digest()
@@ -0,0 +1,65 @@
+"""
+Reading items from fx's standard input
+
+Input is read from the underlying binary stream a block at a time. Each
+block is cut at its last separator, decoded in one go, and split, rather
+than being decoded a line at a time. Names that aren't valid in the
+filesystem encoding survive the trip, as os.fsdecode() would have it.
+"""
+import sys
+
+
+# Read at most this much at a time
+BLOCK = 1 << 16
+
+
+# -----------------------------------------------------------------------------
+def split(fobj, sep="\n"):
+    """
+    Yield the non-empty items in *fobj* separated by *sep*, which is '\\n' or
+    '\\0'. *fobj* may be a text file (whose binary buffer is read if it has
+    one) or a binary one. Items are yielded as soon as the block holding them
+    has been read.
+    """
+    raw = getattr(fobj, 'buffer', fobj)
+    read = getattr(raw, 'read1', raw.read)
+    encoding = sys.getfilesystemencoding()
+    rest = None
+    while True:
+        block = read(BLOCK)
+        if rest is None:
+            rest = block[:0]
+            binary = isinstance(block, bytes)
+            cut_at = sep.encode() if binary else sep
+        if not block:
+            break
+        block = rest + block
+        cut = block.rfind(cut_at)
+        if cut < 0:
+            rest = block
+            continue
+        (done, rest) = (block[:cut], block[cut+1:])
+        if binary:
+            done = done.decode(encoding, 'surrogateescape')
+        for item in done.split(sep):
+            if item:
+                yield item
+    if rest:
+        yield rest.decode(encoding, 'surrogateescape') if binary else rest
+
+
+# -----------------------------------------------------------------------------
+def items(rble, sep=None):
+    """
+    Yield the items in *rble*. If *sep* is None, they're the whitespace
+    separated words on each line and *rble* can be anything that yields
+    lines. Otherwise *rble* is a file and items are separated by *sep*, as
+    for split().
+    """
+    if sep is None:
+        for line in rble:
+            for item in line.split():
+                yield item
+    else:
+        for item in split(rble, sep):
+            yield item
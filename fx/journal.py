@@ -0,0 +1,127 @@
+"""
+A journal of the commands fx has run, so an interrupted run can be resumed
+
+Each command that finishes adds a line to the journal holding a JSON object
+with the command line and its exit status. Lines are only ever appended, so
+a run that's killed part way leaves a journal that's good up to the last
+command that finished. A line cut short is ignored when the journal is
+read, and ended before anything more is added to it, so the next line
+starts afresh.
+
+Every line is handed to the operating system as soon as it's written, so
+killing fx loses nothing. Forcing the lines out to disk is far slower, so
+the journal is fsync()ed only every BATCH lines or SYNC seconds, whichever
+comes first, and when it's closed.
+
+To resume, succeeded() reads a journal into a set of 16 byte digests of the
+commands whose latest run succeeded, and skip() drops those commands from
+the ones about to be run. Commands that failed are run again.
+"""
+from fx import pool
+import hashlib
+import json
+import os
+import time
+
+
+# fsync() the journal after at most this many lines...
+BATCH = 1000
+
+# ... or this many seconds
+SYNC = 1.0
+
+
+# -----------------------------------------------------------------------------
+class Journal(object):
+    """
+    A journal file at *path*, added to as commands finish
+    """
+    def __init__(self, path):
+        self.file = open(path, 'a')
+        if self.file.tell() and not ends_line(path):
+            self.file.write("\n")
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+    def record(self, result):
+        """
+        Add the command and exit status in *result* to the journal
+        """
+        self.file.write(json.dumps({'cmd': pool.cmdline(result.cmd),
+                                    'status': result.status}) + "\n")
+        self.file.flush()
+        self.unsynced += 1
+        if BATCH <= self.unsynced or SYNC <= time.monotonic() - self.synced_at:
+            self.sync()
+
+    def sync(self):
+        """
+        Make sure what's been recorded is on disk
+        """
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+    def close(self):
+        """
+        Sync and close the journal
+        """
+        if self.unsynced:
+            self.sync()
+        self.file.close()
+
+
+# -----------------------------------------------------------------------------
+def ends_line(path):
+    """
+    Whether the file at *path* ends with a newline
+    """
+    with open(path, 'rb') as rbl:
+        rbl.seek(-1, os.SEEK_END)
+        return rbl.read(1) == b"\n"
+
+
+# -----------------------------------------------------------------------------
+def key(cmd):
+    """
+    A digest standing in for *cmd*
+    """
+    data = os.fsencode(pool.cmdline(cmd))
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+# -----------------------------------------------------------------------------
+def succeeded(path):
+    """
+    Return the set of keys of the commands in the journal at *path* that
+    succeeded the last time they were run. A missing journal is empty.
+    """
+    rval = set()
+    try:
+        rble = open(path, 'r')
+    except FileNotFoundError:
+        return rval
+    with rble:
+        for line in rble:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(entry, dict) or 'status' not in entry or \
+                    'cmd' not in entry:
+                continue
+            if entry['status'] == 0:
+                rval.add(key(entry['cmd']))
+            else:
+                rval.discard(key(entry['cmd']))
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def skip(cmds, done):
+    """
+    Yield the commands in *cmds* whose keys aren't in *done*
+    """
+    for cmd in cmds:
+        if key(cmd) not in done:
+            yield cmd
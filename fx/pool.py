@@ -0,0 +1,339 @@
+"""
+Run the commands fx generates, several at a time if asked
+
+Commands are pulled from the caller's iterable only as fast as the workers
+can take them, so the caller can hand in a generator of any length without
+it being materialized here.
+
+A command is either a string, which is run by the shell, or a list of
+arguments, which is run directly without one.
+
+Commands write straight to fx's own stdout and stderr. Nothing they write
+passes through fx, so it costs no memory here and shows up downstream as
+soon as the command writes it.
+
+When several commands run at once and their output mustn't be interleaved,
+each command's stdout is spooled to an anonymous temporary file instead and
+copied to fx's stdout in one piece once the command is done -- in the order
+the commands finish (group) or the order they were given (keep_order). The
+same goes for every command when sys.stdout isn't a file at all (an
+io.StringIO, say, when fx is driven from Python), since there's nowhere
+else for their output to go.
+
+With coproc, commands are fed to long-lived shells (see fx.coproc), one per
+worker, instead of each getting a shell of its own.
+"""
+import collections
+import concurrent.futures as cf
+import functools
+import io
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+# Keeps workers from writing over one another when announcing commands
+LOCK = threading.Lock()
+
+
+# -----------------------------------------------------------------------------
+class Result(object):
+    """
+    What happened when a command was run: its exit status, when it started
+    and ended (by time.monotonic()), its resource usage if known, how many
+    processes fx started to run it, and how many bytes of its output fx
+    passed along (known only when it was spooled).
+
+    For tracing, a Result also notes when the command was queued, when its
+    process was up and running, when its spooled output was copied out
+    (flushed, a (start, end) pair), and which worker ran it.
+    """
+    def __init__(self, cmd, status=0, spool=None, start=None, end=None,
+                 rusage=None, spawned=0):
+        self.cmd = cmd
+        self.status = status
+        self.spool = spool
+        self.start = start
+        self.end = end
+        self.rusage = rusage
+        self.spawned = spawned
+        self.out_bytes = None
+        self.queued = start
+        self.running = None
+        self.flushed = None
+        self.worker = None
+
+    def elapsed(self):
+        """
+        How long the command took, in seconds, or None if it wasn't run
+        """
+        if self.start is None or self.end is None:
+            return None
+        return self.end - self.start
+
+
+# -----------------------------------------------------------------------------
+def cpu_count():
+    """
+    The default number of commands to run at once
+    """
+    return os.cpu_count() or 1
+
+
+# -----------------------------------------------------------------------------
+def stdout_fd():
+    """
+    The file descriptor behind sys.stdout, or None if there isn't one
+    """
+    try:
+        return sys.stdout.fileno()
+    except (AttributeError, ValueError, io.UnsupportedOperation):
+        return None
+
+
+# -----------------------------------------------------------------------------
+def cmdline(cmd):
+    """
+    *cmd* as it would be typed at a shell prompt
+    """
+    if isinstance(cmd, str):
+        return cmd
+    return " ".join(shlex.quote(arg) for arg in cmd)
+
+
+# -----------------------------------------------------------------------------
+def program(cmd):
+    """
+    What to name in a message about *cmd* not starting: the program for an
+    argument list, the whole command line for the shell
+    """
+    if isinstance(cmd, str):
+        return cmd
+    return cmd[0]
+
+
+# -----------------------------------------------------------------------------
+@functools.lru_cache(maxsize=64)
+def which(program):
+    """
+    Look up *program* on $PATH once rather than on every exec
+    """
+    return shutil.which(program)
+
+
+# -----------------------------------------------------------------------------
+def emit(spool):
+    """
+    Copy the spooled output of a finished command to stdout, discard the
+    spool file, and return how many bytes it held. Where possible,
+    os.sendfile() does the copying in the kernel so large outputs never pass
+    through Python.
+    """
+    sys.stdout.flush()
+    size = spool.seek(0, os.SEEK_END)
+    done = 0
+    try:
+        out = sys.stdout.fileno()
+        while done < size:
+            sent = os.sendfile(out, spool.fileno(), done, size - done)
+            if sent == 0:
+                break
+            done += sent
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        pass
+    if done < size:
+        spool.seek(done)
+        if hasattr(sys.stdout, 'buffer'):
+            shutil.copyfileobj(spool, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+        else:
+            text = io.TextIOWrapper(spool, encoding='utf-8', errors='replace')
+            shutil.copyfileobj(text, sys.stdout)
+    spool.close()
+    return size
+
+
+# -----------------------------------------------------------------------------
+def execute(cmd, quiet=True, spool=False, shells=None, queued=None):
+    """
+    Run *cmd*, showing it first unless *quiet*, and return a Result with its
+    exit status. The command's stdin is /dev/null so it can't eat input meant
+    for fx itself.
+
+    With *spool*, the command and its output go to a temporary file, left in
+    the Result for emit(), rather than straight to stdout.
+
+    Given *shells* (a coproc.Shells), the command is run by the calling
+    thread's long-lived shell.
+
+    An argument list is run without a shell. Its program is looked up on
+    $PATH ahead of time and no file descriptors need closing (Python's are
+    not inherited anyway), which lets subprocess use posix_spawn() rather
+    than fork() and exec().
+
+    The command is reaped with os.wait4() so that its user and system time
+    go in the Result along with when it started and ended. *queued* is when
+    the command was handed to the worker, if it was.
+    """
+    out = None
+    if spool:
+        out = tempfile.TemporaryFile()
+        if not quiet:
+            out.write("{}\n".format(cmdline(cmd)).encode())
+            out.flush()
+    else:
+        with LOCK:
+            if not quiet:
+                # one write, so no command's output lands mid-line
+                sys.stdout.write(cmdline(cmd) + "\n")
+            sys.stdout.flush()
+    result = Result(cmd, spool=out, start=time.monotonic())
+    result.queued = queued or result.start
+    result.worker = threading.get_ident()
+    if shells:
+        shell = shells.get()
+        result.spawned = 0 if shell.runs else 1
+        result.running = time.monotonic()
+        result.status = shell.run(cmdline(cmd), out.fileno() if out else 1)
+        result.end = time.monotonic()
+        return result
+    try:
+        with spawn(cmd, out) as proc:
+            result.running = time.monotonic()
+            result.spawned = 1
+            try:
+                (result.status, result.rusage) = wait(proc)
+            except BaseException:
+                proc.kill()
+                raise
+    except OSError as err:
+        print("fx: {}: {}".format(program(cmd), err.strerror),
+              file=sys.stderr)
+        result.status = 127
+    result.end = time.monotonic()
+    return result
+
+
+# -----------------------------------------------------------------------------
+def spawn(cmd, out):
+    """
+    Start *cmd* with its stdout going to *out* (fx's own if None) and return
+    the Popen
+    """
+    if isinstance(cmd, str):
+        kwargs = dict(shell=True)
+    else:
+        kwargs = dict(executable=which(cmd[0]), close_fds=False)
+    return subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=out,
+                            **kwargs)
+
+
+# -----------------------------------------------------------------------------
+def wait(proc):
+    """
+    Wait for *proc* to finish and return (exit status, resource usage), the
+    status as subprocess reports it: negative for a signal
+    """
+    (_, status, rusage) = os.wait4(proc.pid, 0)
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+    return (proc.returncode, rusage)
+
+
+# -----------------------------------------------------------------------------
+def finish(result):
+    """
+    Emit the output of a command that's done, if it was spooled
+    """
+    if result.spool:
+        start = time.monotonic()
+        result.out_bytes = emit(result.spool)
+        result.flushed = (start, time.monotonic())
+        result.spool = None
+    return result
+
+
+# -----------------------------------------------------------------------------
+def run(cmds, dryrun=False, quiet=False, jobs=1, group=False,
+        keep_order=False, coproc=False, governor=None):
+    """
+    Run each command in *cmds*, keeping up to *jobs* of them going at once,
+    and yield a Result for each one as it finishes.
+
+    With *dryrun*, nothing is run; each command is displayed as 'would do ...'
+    and yielded with status 0. Otherwise, unless *quiet*, each command is
+    displayed as it's started.
+
+    With *group*, each command's output (and the command itself) is shown
+    all together when the command finishes. With *keep_order*, that happens
+    in the order the commands were given, and Results are yielded in that
+    order too.
+
+    With *coproc*, commands are run by long-lived shells rather than a new
+    shell apiece.
+
+    Given a *governor* (an adapt.Governor), no more commands are kept going
+    at once than it allows at the time, which may be fewer than *jobs*.
+    """
+    spool = 1 < jobs and (group or keep_order) or stdout_fd() is None
+    shells = None
+    if coproc and not dryrun:
+        from fx.coproc import Shells
+        shells = Shells()
+    try:
+        for result in dispatch(cmds, dryrun, quiet, jobs, keep_order, spool,
+                               shells, governor):
+            yield result
+    finally:
+        if shells:
+            shells.close()
+
+
+# -----------------------------------------------------------------------------
+def dispatch(cmds, dryrun, quiet, jobs, keep_order, spool, shells,
+             governor=None):
+    """
+    Hand out the commands for run(). Commands are handed to the workers
+    until the window is full: twice as many as there are workers, so none
+    of them sits idle, or with a *governor*, as many as it allows right now.
+    """
+    (window, every) = (lambda: 2 * jobs, None)
+    if governor:
+        (window, every) = (governor.limit, governor.interval)
+    if dryrun:
+        for cmd in cmds:
+            print("would do '{}'".format(cmdline(cmd)))
+            yield Result(cmd)
+    elif jobs <= 1:
+        for cmd in cmds:
+            yield finish(execute(cmd, quiet, spool, shells))
+    elif keep_order:
+        with cf.ThreadPoolExecutor(jobs) as executor:
+            pending = collections.deque()
+            for cmd in cmds:
+                while window() <= len(pending):
+                    yield finish(pending.popleft().result())
+                pending.append(executor.submit(execute, cmd, quiet, spool,
+                                               shells, time.monotonic()))
+            while pending:
+                yield finish(pending.popleft().result())
+    else:
+        with cf.ThreadPoolExecutor(jobs) as executor:
+            pending = set()
+            for cmd in cmds:
+                while window() <= len(pending):
+                    done, pending = cf.wait(pending, every,
+                                            return_when=cf.FIRST_COMPLETED)
+                    for future in done:
+                        yield finish(future.result())
+                pending.add(executor.submit(execute, cmd, quiet, spool,
+                                            shells, time.monotonic()))
+            for future in cf.as_completed(pending):
+                yield finish(future.result())
@@ -0,0 +1,205 @@
+"""
+Profiling fx itself, for --profile
+
+When fx is the bottleneck rather than the commands it runs, --profile FILE
+shows where fx's own time goes. The fx_* command handlers are wrapped with
+profiled(), which does nothing unless --profile was given. Then:
+
+  - The handler runs under cProfile and the stats are written to FILE,
+    ready for 'python -m pstats FILE' or snakeviz. cProfile only sees the
+    main thread, which is where commands are generated and output is
+    copied out; time the workers spend waiting on commands isn't fx's.
+
+  - If FILE ends in '.folded', the process is sampled instead, every
+    thread every millisecond of CPU time, and the stacks are written one per
+    line with their counts, as flamegraph.pl and speedscope read them.
+
+  - Either way, the handful of places where fx does work per command
+    (rendering templates, expanding them, starting processes and copying
+    output, and for rename, checking and carrying out the renames) are
+    timed, and a table of calls and seconds spent in each is written to
+    stderr at the end. Those timers are patched in only while profiling, so
+    they cost nothing otherwise.
+"""
+import functools
+import sys
+import time
+
+# What only profiling needs is imported when profiling starts, since this
+# module is imported every time fx runs
+
+
+# Sampling interval, in seconds of CPU time, for '.folded' profiles
+INTERVAL = 0.001
+
+
+# -----------------------------------------------------------------------------
+def profiled(func):
+    """
+    Wrap a command handler so that it runs under a Profile when its
+    --profile option is set
+    """
+    @functools.wraps(func)
+    def wrapper(**kw):
+        if not kw.get('profile'):
+            return func(**kw)
+        with Profile(kw['profile']):
+            return func(**kw)
+    return wrapper
+
+
+# -----------------------------------------------------------------------------
+class Profile(object):
+    """
+    A context manager profiling what runs inside it and writing the results
+    to *path* when it's done
+    """
+    def __init__(self, path):
+        self.path = path
+        self.timers = Timers()
+        self.profiler = None
+        self.samples = None
+
+    def __enter__(self):
+        import collections
+        import signal
+        self.timers.install(targets())
+        if self.path.endswith(".folded"):
+            self.samples = collections.Counter()
+            signal.signal(signal.SIGPROF, self.sample)
+            signal.setitimer(signal.ITIMER_PROF, INTERVAL, INTERVAL)
+        else:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        import signal
+        if self.profiler:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.path)
+        else:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, signal.SIG_DFL)
+            with open(self.path, 'w') as wbl:
+                for (stack, count) in sorted(self.samples.items()):
+                    wbl.write("{} {}\n".format(stack, count))
+        self.timers.uninstall()
+        for line in self.timers.report():
+            print(line, file=sys.stderr)
+        return False
+
+    def sample(self, signum, frame):
+        """
+        Count the current stack of every thread
+        """
+        for (ident, top) in sys._current_frames().items():
+            stack = []
+            while top is not None:
+                code = top.f_code
+                stack.append("{}:{}".format(code.co_filename.split("/")[-1],
+                                            code.co_name))
+                top = top.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+
+# -----------------------------------------------------------------------------
+class Timers(object):
+    """
+    Call counts and total seconds for functions patched to be timed
+    """
+    def __init__(self):
+        import collections
+        import threading
+        self.lock = threading.Lock()
+        self.totals = collections.OrderedDict()
+        self.patched = []
+
+    def install(self, wanted):
+        """
+        Replace each (owner, attribute, timer name) in *wanted* with a timed
+        version. A method a class inherits is timed where it's defined.
+        """
+        for (owner, attr, name) in wanted:
+            if isinstance(owner, type) and attr not in vars(owner):
+                continue
+            func = getattr(owner, attr)
+            self.totals.setdefault(name, [0, 0.0])
+            self.patched.append((owner, attr, func))
+            setattr(owner, attr, self.wrap(func, name))
+
+    def uninstall(self):
+        """
+        Put back what install() replaced
+        """
+        for (owner, attr, func) in reversed(self.patched):
+            setattr(owner, attr, func)
+        self.patched = []
+
+    def wrap(self, func, name):
+        """
+        *func*, timed under *name*
+        """
+        import inspect
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def timed_async(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.add(name, time.perf_counter() - start)
+            return timed_async
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - start)
+        return timed
+
+    def add(self, name, seconds):
+        """
+        Count one call to *name* taking *seconds*
+        """
+        with self.lock:
+            entry = self.totals[name]
+            entry[0] += 1
+            entry[1] += seconds
+
+    def report(self):
+        """
+        The lines of a table of the timers
+        """
+        rval = ["fx: {:<8} {:>10} {:>10} {:>10}"
+                .format("timer", "calls", "seconds", "usec/call")]
+        for (name, (calls, seconds)) in self.totals.items():
+            rval.append("    {:<8} {:>10} {:>10.3f} {:>10.1f}".format(
+                name, calls, seconds, 1e6 * seconds / calls if calls else 0))
+        return rval
+
+
+# -----------------------------------------------------------------------------
+def targets():
+    """
+    The functions to time: (owner, attribute, timer name). The modules are
+    imported here so that asyncio and the rest load only when profiling.
+    """
+    from fx import aio
+    from fx import pool
+    from fx import rename
+    from fx import template
+    import tbx
+    rval = [(cls, 'render', 'render')
+            for cls in (template.Template, template.ArgvTemplate,
+                        template.XargsTemplate, template.XargsArgvTemplate)]
+    rval.extend([(tbx, 'expand', 'expand'),
+                 (pool, 'spawn', 'spawn'),
+                 (aio, 'spawn', 'spawn'),
+                 (pool, 'emit', 'output'),
+                 (rename, 'check', 'check'),
+                 (rename, 'execute', 'rename')])
+    return rval
@@ -0,0 +1,106 @@
+"""
+The sequences of values 'fx count' runs its command for
+
+A range spec is one or more dimensions separated by commas. Each dimension
+is one or more pieces separated by '|', and each piece is either a range of
+numbers, 'low:high' or 'low:high:step', or a literal value. So
+
+    1:10:3      is 1, 4, 7, 10
+    a|b|c       is a, b, c
+    1:3|10      is 1, 2, 3, 10
+    0:1,a|b     is 0a, 0b, 1a, 1b
+
+With more than one dimension, every combination of their values is taken,
+the first dimension changing slowest, and each combination's values are run
+together into one.
+
+Numbers are written with a printf-style format, '%d' unless the caller says
+otherwise ('%04d' to zero pad). Nothing is built ahead of time: ranges are
+Python range objects and combinations are made one at a time, so a spec
+covering billions of values costs no more memory than one covering ten.
+"""
+
+
+# -----------------------------------------------------------------------------
+def values(spec, fmt="%d", inclusive=True):
+    """
+    Return an iterator over the values described by *spec*, as strings. A
+    range's high end is included unless *inclusive* is False. Raise
+    ValueError right away if *spec* or *fmt* doesn't make sense.
+    """
+    dims = [dimension(text, inclusive) for text in spec.split(",")]
+    try:
+        fmt % 0
+    except (TypeError, ValueError):
+        raise ValueError("{} is not a format for one number".format(fmt))
+    return ("".join(render(value, fmt) for value in combo)
+            for combo in product(dims))
+
+
+# -----------------------------------------------------------------------------
+def dimension(text, inclusive=True):
+    """
+    Return the pieces of one dimension of a range spec: range objects for
+    the ranges and numbers, strings for other literals
+    """
+    rval = []
+    for piece in text.split("|"):
+        if ":" not in piece:
+            try:
+                rval.append(range(int(piece), int(piece) + 1))
+            except ValueError:
+                rval.append(piece)
+            continue
+        try:
+            bounds = [int(num) for num in piece.split(":")]
+        except ValueError:
+            bounds = []
+        if len(bounds) not in (2, 3):
+            raise ValueError("{} is not low:high or low:high:step"
+                             .format(piece))
+        (low, high, step) = (bounds + [1])[:3]
+        if step == 0:
+            raise ValueError("{} has a step of zero".format(piece))
+        if inclusive:
+            high += 1 if 0 < step else -1
+        rval.append(range(low, high, step))
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def each(dim):
+    """
+    Yield the values in one dimension
+    """
+    for piece in dim:
+        if isinstance(piece, str):
+            yield piece
+        else:
+            for value in piece:
+                yield value
+
+
+# -----------------------------------------------------------------------------
+def product(dims):
+    """
+    Yield a tuple for each combination of values in *dims*. Unlike
+    itertools.product(), this never copies a dimension into memory; each
+    one after the first is simply gone through again for every value of the
+    one before.
+    """
+    if not dims:
+        yield ()
+        return
+    for head in each(dims[0]):
+        for tail in product(dims[1:]):
+            yield (head,) + tail
+
+
+# -----------------------------------------------------------------------------
+def render(value, fmt):
+    """
+    *value* as a string, formatted with *fmt* if it's a number
+    """
+    if isinstance(value, int):
+        return fmt % value
+    return value
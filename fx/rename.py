@@ -0,0 +1,289 @@
+"""
+Bulk renames, planned in full before anything is touched
+
+The whole set of renames is worked out first as a map from old name to new.
+Two files headed for the same name, or a new name that would land on an
+existing file that isn't itself being renamed, is an error caught before any
+file moves. Renames that depend on each other (a -> b while b -> c) are done
+in an order that never clobbers anything, and cycles (x -> y, y -> x) are
+broken by parking one file under a temporary name.
+
+Each step is a dict or set lookup and each directory involved is listed at
+most once, so planning takes time in proportion to the number of files.
+
+When no file changes directories, the renames are carried out a directory at
+a time relative to a descriptor for that directory, so the path to it is
+looked up once rather than twice per file. That matters on network
+filesystems, where each lookup is a round trip; for the same reason several
+directories can be worked on at once in threads.
+
+Names too many to hold at once (say, streamed from 'find -print0') can be
+planned with plan_stream(), which checks them all a chunk at a time, keeping
+the checked chunks in a temporary file, and then hands them back to be
+renamed a chunk at a time.
+"""
+from fx import inputs
+import concurrent.futures as cf
+import hashlib
+import itertools
+import os
+import re
+import tempfile
+import threading
+
+
+# -----------------------------------------------------------------------------
+class RenameError(Exception):
+    """
+    A set of renames that can't be carried out safely
+    """
+    pass
+
+
+# -----------------------------------------------------------------------------
+def parse(subst):
+    """
+    Split a substitution like 's/old/new/' into (old, new). Any character
+    may stand in for '/' as long as it's used throughout.
+    """
+    pieces = subst.split(subst[1])
+    return (pieces[1], pieces[2])
+
+
+# -----------------------------------------------------------------------------
+def plan(names, subst):
+    """
+    Apply *subst* to each of *names* and return a dict mapping each name
+    that changes to its new name. Raise RenameError if two names would end up
+    the same or a new name is already taken by a file that isn't moving.
+    """
+    rval = dict(changes(names, subst))
+    check(rval)
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def plan_stream(names, subst, size=10000):
+    """
+    Like plan(), but read *names* a bit at a time and yield the renames in
+    chunks of up to *size*. Every chunk is checked before the first one is
+    yielded, so a RenameError comes before any file has been renamed; the
+    checked chunks wait in a temporary file meanwhile.
+
+    While checking, the chunk at hand is held in memory along with a digest
+    of each new name so far, so that two files headed for the same name are
+    caught even when they're in different chunks. A digest is 16 bytes, but
+    as an object in a set it takes about 90: some 90MB per million names.
+
+    Renames that depend on each other are ordered within a chunk, but not
+    across chunks: a new name taken by a file that isn't moving in the same
+    chunk counts as an overwrite.
+    """
+    claimed = set()
+    with tempfile.TemporaryFile() as spool:
+        for chunk in chunks(changes(names, subst), size):
+            check(chunk, claimed)
+            for (name, newname) in chunk.items():
+                spool.write(os.fsencode(name) + b"\0" +
+                            os.fsencode(newname) + b"\0")
+        # The digests aren't needed while the files are being renamed
+        claimed = None
+        spool.seek(0)
+        fields = inputs.split(spool, "\0")
+        for chunk in chunks(zip(fields, fields), size):
+            yield chunk
+
+
+# -----------------------------------------------------------------------------
+def chunks(pairs, size):
+    """
+    Yield dicts of up to *size* of the (name, new name) *pairs* at a time
+    """
+    chunk = {}
+    for (name, newname) in pairs:
+        chunk[name] = newname
+        if size <= len(chunk):
+            yield chunk
+            chunk = {}
+    if chunk:
+        yield chunk
+
+
+# -----------------------------------------------------------------------------
+def changes(names, subst):
+    """
+    Apply *subst* to each of *names* and yield (name, new name) for each one
+    that changes
+    """
+    (old, new) = parse(subst)
+    regex = re.compile(old)
+    for name in names:
+        newname = regex.sub(new, name)
+        if newname != name:
+            yield (name, newname)
+
+
+# -----------------------------------------------------------------------------
+def check(renames, claimed=None):
+    """
+    Raise RenameError if *renames* would send two files to the same name or
+    overwrite a file that isn't being renamed itself.
+
+    If *claimed* is a set, new names are also checked against (and added
+    to) the digests in it. Existing files are then looked for one at a time
+    rather than by listing their directories, which would otherwise be
+    listed again for every chunk.
+    """
+    seen = {}
+    listings = {}
+    problems = []
+    for (src, dst) in renames.items():
+        if not dst:
+            problems.append("{} would have no name left".format(src))
+            continue
+        if dst in seen:
+            problems.append("{} and {} would both become {}"
+                            .format(seen[dst], src, dst))
+            continue
+        seen[dst] = src
+        if claimed is not None:
+            key = hashlib.blake2b(os.fsencode(dst), digest_size=16).digest()
+            if key in claimed:
+                problems.append("{} would become {}, as an earlier file did"
+                                .format(src, dst))
+                continue
+            claimed.add(key)
+        if dst in renames:
+            continue
+        if claimed is not None:
+            if os.path.lexists(dst):
+                problems.append("{} would overwrite {}".format(src, dst))
+            continue
+        (parent, base) = os.path.split(dst)
+        parent = parent or "."
+        if parent not in listings:
+            try:
+                listings[parent] = set(os.listdir(parent))
+            except OSError:
+                listings[parent] = set()
+        if base in listings[parent]:
+            problems.append("{} would overwrite {}".format(src, dst))
+    if problems:
+        raise RenameError("\n".join(problems))
+
+
+# -----------------------------------------------------------------------------
+def steps(renames):
+    """
+    Yield (src, dst, final) for each os.rename() needed to carry out
+    *renames* safely, where *final* is the (old, new) name pair the step
+    completes, or None for the step parking a file under a temporary name.
+
+    Each chain of dependent renames is followed to its end and then done
+    back to front, so every new name is free by the time it's used. If the
+    chain loops back on itself, its last file is parked first and moved into
+    place once the rest of the loop is done.
+    """
+    done = set()
+    counter = itertools.count()
+    for start in renames:
+        if start in done:
+            continue
+        path = [start]
+        where = {start: 0}
+        while renames[path[-1]] in renames:
+            nxt = renames[path[-1]]
+            if nxt in done or nxt in where:
+                break
+            where[nxt] = len(path)
+            path.append(nxt)
+        last = path[-1]
+        parked = None
+        if renames[last] in where:
+            parked = temp_name(renames[last], counter)
+            yield (last, parked, None)
+            path.pop()
+        for src in reversed(path):
+            yield (src, renames[src], (src, renames[src]))
+        if parked:
+            yield (parked, renames[last], (last, renames[last]))
+            path.append(last)
+        done.update(path)
+
+
+# -----------------------------------------------------------------------------
+def temp_name(near, counter):
+    """
+    A name not in use in the same directory as *near*
+    """
+    (parent, base) = os.path.split(near)
+    while True:
+        stem = ".fx-{}-{}-{}".format(os.getpid(), next(counter), base)
+        name = os.path.join(parent, stem)
+        if not os.path.lexists(name):
+            return name
+
+
+# -----------------------------------------------------------------------------
+def by_directory(renames):
+    """
+    Split *renames* into a dict of {directory: renames in it}, or return None
+    if any file would move to a different directory
+    """
+    rval = {}
+    for (src, dst) in renames.items():
+        parent = os.path.dirname(src)
+        if os.path.dirname(dst) != parent:
+            return None
+        rval.setdefault(parent, {})[src] = dst
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def rename_in(parent, renames, announce=None):
+    """
+    Carry out *renames*, all of them within directory *parent*, by name
+    relative to the directory rather than by path
+    """
+    flags = os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0)
+    dirfd = os.open(parent or ".", flags)
+    try:
+        for (src, dst, final) in steps(renames):
+            if final and announce:
+                announce(*final)
+            os.rename(os.path.basename(src), os.path.basename(dst),
+                      src_dir_fd=dirfd, dst_dir_fd=dirfd)
+    finally:
+        os.close(dirfd)
+
+
+# -----------------------------------------------------------------------------
+def execute(renames, announce=None, jobs=1):
+    """
+    Carry out *renames*, calling announce(old, new) for each file just
+    before it gets its new name. If no file changes directories, up to
+    *jobs* directories are worked on at once.
+    """
+    groups = by_directory(renames)
+    if groups is None or os.rename not in os.supports_dir_fd:
+        for (src, dst, final) in steps(renames):
+            if final and announce:
+                announce(*final)
+            os.rename(src, dst)
+    elif jobs <= 1 or len(groups) <= 1:
+        for (parent, group) in groups.items():
+            rename_in(parent, group, announce)
+    else:
+        if announce:
+            lock = threading.Lock()
+            show = announce
+
+            def announce(old, new):
+                with lock:
+                    show(old, new)
+
+        with cf.ThreadPoolExecutor(jobs) as executor:
+            futures = [executor.submit(rename_in, parent, group, announce)
+                       for (parent, group) in groups.items()]
+            for future in futures:
+                future.result()
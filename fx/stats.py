@@ -0,0 +1,192 @@
+"""
+Where the time went in an fx run, for --stats and --stats-json
+
+A Stats is handed each Result as its command finishes and keeps just enough
+to report on the run afterwards: every command's duration (for the
+percentiles and histogram), the few slowest commands, and running totals.
+The user and system time of the commands themselves come from
+getrusage(RUSAGE_CHILDREN), which counts every process fx has waited for,
+whichever engine ran them; fx's own comes from RUSAGE_SELF. Together they
+show how much of the run was fx rather than the commands.
+
+Durations are put in histogram buckets by powers of two, from a millisecond
+up. Output is only counted when fx spooled it: when the commands write
+straight to fx's stdout, fx never sees it, so output_bytes is None (null in
+the JSON) rather than 0.
+"""
+from fx import pool
+import heapq
+import itertools
+import json
+import resource
+import time
+
+
+# How many of the slowest commands to report
+SLOWEST = 5
+
+# The upper bound of the first histogram bucket, in seconds
+BUCKET = 0.001
+
+
+# -----------------------------------------------------------------------------
+class Stats(object):
+    """
+    The numbers for a run that starts when the Stats is made
+    """
+    def __init__(self, slowest=SLOWEST):
+        self.start = time.monotonic()
+        self.end = None
+        self.self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        self.child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.slowest = slowest
+        self.durations = []
+        self.heap = []
+        self.counter = itertools.count()
+        self.failed = 0
+        self.spawned = 0
+        self.out_bytes = None
+
+    def add(self, result):
+        """
+        Count in the Result of a command that's finished
+        """
+        if result.status != 0:
+            self.failed += 1
+        self.spawned += result.spawned
+        if result.out_bytes is not None:
+            self.out_bytes = (self.out_bytes or 0) + result.out_bytes
+        elapsed = result.elapsed()
+        if elapsed is None:
+            return
+        self.durations.append(elapsed)
+        entry = (elapsed, next(self.counter), result)
+        if len(self.heap) < self.slowest:
+            heapq.heappush(self.heap, entry)
+        elif self.heap and self.heap[0][0] < elapsed:
+            heapq.heapreplace(self.heap, entry)
+
+    def summary(self):
+        """
+        Return a dict of the numbers for the run so far
+        """
+        wall = (self.end or time.monotonic()) - self.start
+        me = resource.getrusage(resource.RUSAGE_SELF)
+        kids = resource.getrusage(resource.RUSAGE_CHILDREN)
+        durations = sorted(self.durations)
+        jobs = len(durations)
+        slowest = sorted(self.heap, reverse=True)
+        return {
+            'jobs': jobs,
+            'failed': self.failed,
+            'wall': wall,
+            'jobs_per_sec': jobs / wall if wall else None,
+            'fx_user': me.ru_utime - self.self_usage.ru_utime,
+            'fx_sys': me.ru_stime - self.self_usage.ru_stime,
+            'child_user': kids.ru_utime - self.child_usage.ru_utime,
+            'child_sys': kids.ru_stime - self.child_usage.ru_stime,
+            'job_time': sum(durations),
+            'p50': percentile(durations, 50),
+            'p90': percentile(durations, 90),
+            'p99': percentile(durations, 99),
+            'max': durations[-1] if durations else None,
+            'histogram': histogram(durations),
+            'slowest': [job(result) for (_, _, result) in slowest],
+            'processes': self.spawned,
+            'output_bytes': self.out_bytes,
+        }
+
+    def finish(self):
+        """
+        Note that the run is over
+        """
+        self.end = time.monotonic()
+
+
+# -----------------------------------------------------------------------------
+def job(result):
+    """
+    A dict describing one command's Result
+    """
+    rval = {'cmd': pool.cmdline(result.cmd), 'status': result.status,
+            'wall': result.elapsed()}
+    if result.rusage:
+        rval['user'] = result.rusage.ru_utime
+        rval['sys'] = result.rusage.ru_stime
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def percentile(durations, pct):
+    """
+    The *pct* percentile of the sorted *durations*, by nearest rank, or None
+    if there aren't any
+    """
+    if not durations:
+        return None
+    rank = max(1, -(-pct * len(durations) // 100))
+    return durations[rank - 1]
+
+
+# -----------------------------------------------------------------------------
+def histogram(durations):
+    """
+    Return a list of [upper bound, count] for each histogram bucket from the
+    first to the last one that isn't empty
+    """
+    rval = []
+    bound = BUCKET
+    idx = 0
+    while idx < len(durations):
+        count = 0
+        while idx < len(durations) and durations[idx] < bound:
+            count += 1
+            idx += 1
+        rval.append([bound, count])
+        bound *= 2
+    while rval and not rval[0][1]:
+        rval.pop(0)
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def text(summary):
+    """
+    The lines of a report on *summary* for people to read
+    """
+    rval = ["fx: {jobs} jobs ({failed} failed) in {wall:.3f}s".format(
+        **summary)]
+    if summary['jobs_per_sec'] is not None:
+        output = "output not spooled"
+        if summary['output_bytes'] is not None:
+            output = "{} bytes of output spooled".format(
+                summary['output_bytes'])
+        rval.append("    {:.1f} jobs/sec, {} processes started, {}".format(
+            summary['jobs_per_sec'], summary['processes'], output))
+    rval.append("    fx:       {fx_user:.3f}s user {fx_sys:.3f}s sys"
+                .format(**summary))
+    rval.append("    commands: {child_user:.3f}s user {child_sys:.3f}s sys, "
+                "{job_time:.3f}s wall in all".format(**summary))
+    if not summary['jobs']:
+        return rval
+    rval.append("    wall per job: p50 {:.3f}s p90 {:.3f}s p99 {:.3f}s "
+                "max {:.3f}s".format(summary['p50'], summary['p90'],
+                                     summary['p99'], summary['max']))
+    most = max(count for (_, count) in summary['histogram'])
+    for (bound, count) in summary['histogram']:
+        bar = "#" * (-(-40 * count // most))
+        rval.append("    < {:>9.3f}s {:>8} {}".format(bound, count, bar))
+    rval.append("    slowest:")
+    for entry in summary['slowest']:
+        rval.append("    {:>10.3f}s  {}".format(entry['wall'], entry['cmd']))
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def write_json(summary, path):
+    """
+    Write *summary* to *path* as JSON
+    """
+    with open(path, 'w') as wbl:
+        json.dump(summary, wbl, indent=2)
+        wbl.write("\n")
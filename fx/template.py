@@ -0,0 +1,164 @@
+"""
+Command templates compiled once per run
+
+Expanding '~' and '$VARS' and locating '%' in a command template only has to
+happen once. After that, filling in items is plain string concatenation, so
+the cost per item doesn't depend on how many items a command line holds.
+
+The Argv* variants split the template into arguments with shlex, also once,
+and render argument lists that can be run without a shell.
+
+A template that can't be compiled -- one shlex can't split, or an xargs
+template with '%' in more than one word -- raises ValueError saying why.
+"""
+import os
+import shlex
+import struct
+import tbx
+
+
+# exec() charges each argument its bytes, a NUL, and a pointer
+ARG_OVERHEAD = 1 + struct.calcsize('P')
+
+
+# -----------------------------------------------------------------------------
+class Template(object):
+    """
+    A command template with each '%' standing for the item, as in
+
+        'mv % %.bak'  => 'mv <item> <item>.bak'
+
+    '~' and '$VARS' are expanded when the template is compiled (unless
+    *expand* is False), not in the items substituted into it.
+    """
+    def __init__(self, cmd, expand=True):
+        self.cmd = tbx.expand(cmd) if expand else cmd
+        self.pieces = self.cmd.split('%')
+
+    def render(self, item):
+        """
+        The command for *item*
+        """
+        return item.join(self.pieces)
+
+
+# -----------------------------------------------------------------------------
+class ArgvTemplate(object):
+    """
+    A command template for running without a shell. It's split into
+    arguments with shlex, then each argument is treated as a Template, so a
+    file name with spaces in it stays a single argument:
+
+        'mv % %.bak'  => ['mv', '<item>', '<item>.bak']
+    """
+    def __init__(self, cmd):
+        self.args = [Template(arg) for arg in split(cmd)]
+
+    def render(self, item):
+        """
+        The argument list for *item*
+        """
+        return [arg.render(item) for arg in self.args]
+
+
+# -----------------------------------------------------------------------------
+class XargsTemplate(object):
+    """
+    An xargs command template. The whitespace delimited word containing '%'
+    is repeated once per item, with '%' replaced by the item, so that
+
+        'foobar'     => 'foobar <item1> <item2> ... <itemn>'
+        'foo% bar'   => 'foo<item1> foo<item2> ... foo<itemn> bar'
+        'foo %bar'   => 'foo <item1>bar <item2>bar ... <itemn>bar'
+        'foo % bar'  => 'foo <item1> <item2> ... <itemn> bar'
+
+    If there's no '%', items are added at the end of the command.
+    """
+    def __init__(self, cmd):
+        cmd = tbx.expand(cmd)
+        pos = cmd.find('%')
+        if pos < 0:
+            (self.head, self.word, self.tail) = (cmd + " ", "%", "")
+        else:
+            start = pos
+            while 0 < start and not cmd[start-1].isspace():
+                start -= 1
+            end = pos
+            while end < len(cmd) and not cmd[end].isspace():
+                end += 1
+            (self.head, self.word, self.tail) = (cmd[:start],
+                                                 cmd[start:end],
+                                                 cmd[end:])
+            if '%' in self.tail:
+                raise ValueError("only one word of '{}' may contain '%'"
+                                 .format(cmd))
+        self.pieces = Template(self.word, expand=False).pieces
+        self.size = len(os.fsencode(self.head + self.tail)) - 1
+        self.word_size = len(os.fsencode("".join(self.pieces))) + 1
+        self.npct = len(self.pieces) - 1
+
+    def item_size(self, item):
+        """
+        How many bytes *item* adds to a command line, counting the space
+        that separates it from its neighbours
+        """
+        return self.word_size + self.npct * len(os.fsencode(item))
+
+    def render(self, items):
+        """
+        The command line holding *items*
+        """
+        if self.npct == 1:
+            (prefix, suffix) = self.pieces
+            if prefix or suffix:
+                items = [prefix + item + suffix for item in items]
+        else:
+            items = [item.join(self.pieces) for item in items]
+        return self.head + " ".join(items) + self.tail
+
+
+# -----------------------------------------------------------------------------
+class XargsArgvTemplate(XargsTemplate):
+    """
+    An xargs command template for running without a shell. The argument
+    containing '%' is repeated once per item, as with XargsTemplate, and the
+    render() result is an argument list. Sizes are counted the way exec()
+    counts them against ARG_MAX.
+    """
+    def __init__(self, cmd):
+        args = [tbx.expand(arg) for arg in split(cmd)]
+        where = [idx for (idx, arg) in enumerate(args) if '%' in arg]
+        if 1 < len(where):
+            raise ValueError("only one argument of '{}' may contain '%'"
+                             .format(cmd))
+        elif where:
+            (self.head, self.word, self.tail) = (args[:where[0]],
+                                                 args[where[0]],
+                                                 args[where[0]+1:])
+        else:
+            (self.head, self.word, self.tail) = (args, "%", [])
+        self.pieces = Template(self.word, expand=False).pieces
+        self.size = sum(len(os.fsencode(arg)) + ARG_OVERHEAD
+                        for arg in self.head + self.tail)
+        self.word_size = len(os.fsencode("".join(self.pieces))) + ARG_OVERHEAD
+        self.npct = len(self.pieces) - 1
+
+    def render(self, items):
+        """
+        The argument list holding *items*
+        """
+        return (self.head + [item.join(self.pieces) for item in items] +
+                self.tail)
+
+
+# -----------------------------------------------------------------------------
+def split(cmd):
+    """
+    *cmd* split into arguments as the shell would. Raise ValueError, naming
+    *cmd*, if it can't be (an unclosed quote, say).
+    """
+    try:
+        return shlex.split(cmd)
+    except ValueError as err:
+        raise ValueError("can't split '{}' into arguments: {}"
+                         .format(cmd, str(err).lower()))
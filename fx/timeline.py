@@ -0,0 +1,109 @@
+"""
+Job timelines in Chrome's trace event format, for --trace
+
+The file written can be loaded into Perfetto (ui.perfetto.dev) or
+chrome://tracing to see how busy the workers were, where they sat idle, and
+which commands held things up. Each command shows up as
+
+    job    on its worker's track, from the moment a worker took it to when
+           it finished, made up of
+    spawn  starting its process (or handing it to a --coproc shell) and
+    run    the process running;
+    queue  on a track of its own, from when the command was handed to the
+           workers to when one of them took it up; and
+    flush  on fx's own track, copying its spooled output to stdout.
+
+Events are written as each command finishes, so the trace of a long run is
+never held in memory, and one cut short by Ctrl-C can still be loaded (the
+format allows the closing ']' to be missing).
+"""
+from fx import pool
+import json
+import os
+
+
+# -----------------------------------------------------------------------------
+class Timeline(object):
+    """
+    A trace file at *path*, with times measured from *origin* (a
+    time.monotonic() value)
+    """
+    def __init__(self, path, origin):
+        self.file = open(path, 'w')
+        self.origin = origin
+        self.pid = os.getpid()
+        self.lanes = {}
+        self.count = 0
+        self.sep = "\n"
+        self.file.write("[")
+        self.event(ph='M', name='process_name', tid=0,
+                   args={'name': 'fx'})
+        self.event(ph='M', name='thread_name', tid=0, args={'name': 'fx'})
+
+    def add(self, result):
+        """
+        Add the events for a finished command's *result*
+        """
+        if result.start is None:
+            return
+        self.count += 1
+        name = pool.cmdline(result.cmd)
+        tid = self.lane(result.worker)
+        if result.start - result.queued:
+            self.span('queue', name, result.queued, result.start, ph='b')
+        self.span('job', name, result.start, result.end, tid=tid,
+                  args={'status': result.status})
+        running = result.running or result.end
+        self.span('spawn', name, result.start, running, tid=tid)
+        if result.running:
+            self.span('run', name, result.running, result.end, tid=tid)
+        if result.flushed:
+            self.span('flush', name, *result.flushed,
+                      args={'bytes': result.out_bytes})
+
+    def lane(self, worker):
+        """
+        The track number for *worker*, named the first time it's seen
+        """
+        if worker not in self.lanes:
+            tid = self.lanes[worker] = len(self.lanes) + 1
+            self.event(ph='M', name='thread_name', tid=tid,
+                       args={'name': 'worker {}'.format(tid)})
+        return self.lanes[worker]
+
+    def span(self, cat, name, start, end, tid=0, ph='X', args=None):
+        """
+        Write a span from *start* to *end*: a complete ('X') event, or with
+        ph='b' a pair of async events
+        """
+        fields = dict(cat=cat, name="{}: {}".format(cat, name), tid=tid,
+                      ts=self.usec(start))
+        if args:
+            fields['args'] = args
+        if ph == 'X':
+            self.event(ph='X', dur=self.usec(end) - fields['ts'], **fields)
+        else:
+            self.event(ph='b', id=self.count, **fields)
+            fields['ts'] = self.usec(end)
+            self.event(ph='e', id=self.count, **fields)
+
+    def usec(self, when):
+        """
+        *when* in microseconds since the origin
+        """
+        return round((when - self.origin) * 1e6, 1)
+
+    def event(self, **fields):
+        """
+        Write one event
+        """
+        fields['pid'] = self.pid
+        self.file.write(self.sep + json.dumps(fields))
+        self.sep = ",\n"
+
+    def close(self):
+        """
+        Finish the file
+        """
+        self.file.write("\n]\n")
+        self.file.close()
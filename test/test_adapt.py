@@ -0,0 +1,138 @@
+from fx import adapt
+from fx import aio
+from fx import pool
+import pytest
+
+
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def machine(monkeypatch):
+    """
+    A machine whose load, available memory and pressure the test sets
+    """
+    state = {'load': 0.0, 'free': 1 << 40, 'cpu': 0.0, 'io': 0.0,
+             'memory': 0.0}
+    monkeypatch.setattr(adapt, 'loadavg', lambda: state['load'])
+    monkeypatch.setattr(adapt, 'available', lambda: state['free'])
+    monkeypatch.setattr(adapt, 'pressure', lambda resource: state[resource])
+    return state
+
+
+# -----------------------------------------------------------------------------
+def test_load(machine):
+    """
+    Over --max-load, the limit is -j less the excess, and no lower however
+    long the load stays there. Under it, the limit climbs back by one.
+    """
+    pytest.dbgfunc()
+    governor = adapt.Governor(8, max_load=4.0)
+    governor.interval = 0
+    machine['load'] = 6.5
+    assert [governor.limit() for _ in range(3)] == [5, 5, 5]
+    machine['load'] = 1.0
+    assert [governor.limit() for _ in range(4)] == [6, 7, 8, 8]
+    machine['cpu'] = 55.0
+    assert governor.limit() == 4
+
+
+# -----------------------------------------------------------------------------
+def test_memory(machine):
+    """
+    With too little memory available, or memory pressure, the limit is
+    halved, down to 1
+    """
+    pytest.dbgfunc()
+    governor = adapt.Governor(8, min_free=1000)
+    governor.interval = 0
+    machine['free'] = 999
+    assert [governor.limit() for _ in range(5)] == [4, 2, 1, 1, 1]
+    machine['free'] = 1000
+    assert governor.limit() == 2
+    machine['memory'] = adapt.PRESSURE
+    assert governor.limit() == 1
+
+
+# -----------------------------------------------------------------------------
+def test_interval(machine):
+    """
+    The machine is looked at no more often than every interval
+    """
+    pytest.dbgfunc()
+    governor = adapt.Governor(8, max_load=4.0)
+    machine['load'] = 10.0
+    assert governor.limit() == 2
+    machine['load'] = 0.0
+    assert governor.limit() == 2
+
+
+# -----------------------------------------------------------------------------
+def test_readers(tmpdir):
+    """
+    Available memory comes from /proc/meminfo, or is worked out on older
+    kernels; stall percentages come from /proc/pressure, 0.0 if missing
+    """
+    pytest.dbgfunc()
+    meminfo = tmpdir.join("meminfo")
+    meminfo.write("MemTotal: 100 kB\nMemFree: 10 kB\nMemAvailable: 40 kB\n"
+                  "Buffers: 5 kB\nCached: 20 kB\nHugePages_Total: 0\n")
+    assert adapt.available(meminfo.strpath) == 40 * 1024
+    meminfo.write("MemTotal: 100 kB\nMemFree: 10 kB\nBuffers: 5 kB\n"
+                  "Cached: 20 kB\n")
+    assert adapt.available(meminfo.strpath) == 35 * 1024
+    tmpdir.join("cpu").write("some avg10=12.50 avg60=3.00 avg300=1.00 "
+                             "total=12345\n")
+    assert adapt.pressure("cpu", tmpdir.strpath) == 12.5
+    assert adapt.pressure("io", tmpdir.strpath) == 0.0
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("text, exp", [
+    ("1500", 1500), ("4k", 4096), ("512M", 512 << 20), ("1.5G", 3 << 29),
+    ])
+def test_size(text, exp):
+    """
+    Sizes may have a K, M, G or T suffix
+    """
+    pytest.dbgfunc()
+    assert adapt.size(text) == exp
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("text", ["", "G", "lots", "-1M"])
+def test_size_bad(text):
+    """
+    Anything else is a ValueError
+    """
+    pytest.dbgfunc()
+    with pytest.raises(ValueError):
+        adapt.size(text)
+
+
+# -----------------------------------------------------------------------------
+class Fixed(object):
+    """
+    A governor that always allows the same number of commands
+    """
+    interval = 0.01
+
+    def __init__(self, count):
+        self.count = count
+
+    def limit(self):
+        return self.count
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("engine", [pool, aio])
+@pytest.mark.parametrize("keep_order", [False, True])
+def test_governed(engine, keep_order):
+    """
+    pool.run() and aio.run() keep no more commands going than the governor
+    allows, even with more jobs
+    """
+    pytest.dbgfunc()
+    results = list(engine.run(["sleep 0.1"] * 4, quiet=True, jobs=4,
+                              keep_order=keep_order, governor=Fixed(2)))
+    spans = sorted((r.start, r.end) for r in results)
+    for (idx, (start, _)) in enumerate(spans):
+        assert sum(1 for (_, end) in spans[:idx] if start < end) < 2
@@ -0,0 +1,136 @@
+from fx import aio
+import os
+import pytest
+import signal
+import subprocess
+import threading
+import time
+
+
+# -----------------------------------------------------------------------------
+def test_run_serial(capfd):
+    """
+    With jobs=1, each command is shown, then run, in order
+    """
+    pytest.dbgfunc()
+    result = list(aio.run(["echo one", ["echo", "two words"]]))
+    assert [r.status for r in result] == [0, 0]
+    assert capfd.readouterr().out == ("echo one\none\n"
+                                      "echo 'two words'\ntwo words\n")
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_run_status(jobs):
+    """
+    A failing command is reported with its exit status, and one that can't
+    be started with 127
+    """
+    pytest.dbgfunc()
+    result = {str(r.cmd): r.status
+              for r in aio.run(["true", "exit 3", ["fx-no-such-program"]],
+                               quiet=True, jobs=jobs)}
+    assert result == {"true": 0, "exit 3": 3, "['fx-no-such-program']": 127}
+
+
+# -----------------------------------------------------------------------------
+def test_run_keep_order(capfd):
+    """
+    With keep_order, output and Results come in the order the commands were
+    given, however long each took
+    """
+    pytest.dbgfunc()
+    cmds = ["sleep 0.{}; echo {}".format(3 - idx, idx) for idx in range(3)]
+    result = list(aio.run(cmds, quiet=True, jobs=3, keep_order=True))
+    assert [r.cmd for r in result] == cmds
+    assert capfd.readouterr().out == "0\n1\n2\n"
+
+
+# -----------------------------------------------------------------------------
+def test_run_many():
+    """
+    Hundreds of commands can run at once
+    """
+    pytest.dbgfunc()
+    start = time.monotonic()
+    result = list(aio.run(["sleep 1"] * 300, quiet=True, jobs=300))
+    assert [r.status for r in result] == [0] * 300
+    assert time.monotonic() - start < 10
+
+
+# -----------------------------------------------------------------------------
+def test_timeout():
+    """
+    A command that runs too long, and whatever it started, gets SIGTERM
+    """
+    pytest.dbgfunc()
+    start = time.monotonic()
+    result = list(aio.run(["sleep 30 & wait", "true"], quiet=True, jobs=2,
+                          timeout=0.5))
+    assert sorted(r.status for r in result) == [-signal.SIGTERM, 0]
+    assert time.monotonic() - start < 5
+
+
+# -----------------------------------------------------------------------------
+def test_timeout_kill(monkeypatch):
+    """
+    A command that ignores SIGTERM gets SIGKILL GRACE seconds later
+    """
+    pytest.dbgfunc()
+    monkeypatch.setattr(aio, 'GRACE', 0.5)
+    start = time.monotonic()
+    result = list(aio.run(["trap '' TERM; sleep 30"], quiet=True,
+                          timeout=0.5))
+    assert result[0].status == -signal.SIGKILL
+    assert time.monotonic() - start < 5
+
+
+# -----------------------------------------------------------------------------
+def test_cancel():
+    """
+    Closing the generator early stops the commands still running
+    """
+    pytest.dbgfunc()
+    start = time.monotonic()
+    results = aio.run(["true", "sleep 30", "sleep 30"], quiet=True, jobs=3)
+    assert next(results).cmd == "true"
+    results.close()
+    assert time.monotonic() - start < 5
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.skipif(not hasattr(os, 'pidfd_open'), reason="no pidfds")
+def test_threads():
+    """
+    Where there are pidfds, running many commands at once doesn't take a
+    thread each
+    """
+    pytest.dbgfunc()
+    cmds = ["sleep 0.3"] + ["sleep 1"] * 49
+    counts = []
+    for result in aio.run(cmds, quiet=True, jobs=50):
+        assert result.status == 0
+        counts.append(threading.active_count())
+    assert max(counts) < 5
+
+
+# -----------------------------------------------------------------------------
+def test_ctrl_c(tmpdir):
+    """
+    Ctrl-C stops fx and the commands it's running
+    """
+    pytest.dbgfunc()
+    pidfile = tmpdir.join("pid")
+    fxdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                         "fx")
+    proc = subprocess.Popen(["python", fxdir, "cmd", "-q", "--asyncio",
+                             "echo $$ > %; exec sleep 30", pidfile.strpath])
+    deadline = time.monotonic() + 10
+    while not pidfile.check() or not pidfile.read():
+        assert proc.poll() is None, "fx exited before the command started"
+        assert time.monotonic() < deadline, "the command never started"
+        time.sleep(0.1)
+    os.kill(proc.pid, signal.SIGINT)
+    proc.wait(5)
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pidfile.read()), 0)
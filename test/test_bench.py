@@ -0,0 +1,47 @@
+from fx import bench
+import pytest
+
+
+# -----------------------------------------------------------------------------
+def test_xargs_batching_flat():
+    """
+    The cost per item of xargs batching shouldn't grow with the length of the
+    command lines. The bound is loose so a busy machine won't trip it -- the
+    quadratic version this guards against was hundreds of times slower.
+    """
+    pytest.dbgfunc()
+    result = bench.xargs_batching(count=20000, limits=(4096, 131071))
+    [(_, short_lines, short), (_, long_lines, long)] = result
+    assert long_lines < short_lines
+    assert long < 5 * short
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("name", sorted(bench.BENCHMARKS))
+def test_measure(name):
+    """
+    Each benchmark runs in a process of its own and reports its rate and
+    peak RSS
+    """
+    pytest.dbgfunc()
+    result = bench.measure(name, 0.001)
+    assert 1 <= result['items']
+    assert 0 < result['rate']
+    assert 0 < result['peak_rss_kb']
+
+
+# -----------------------------------------------------------------------------
+def test_compare():
+    """
+    A benchmark more than the tolerance slower than its baseline is flagged
+    """
+    pytest.dbgfunc()
+    results = {'a': {'rate': 70.0, 'peak_rss_kb': 10},
+               'b': {'rate': 95.0, 'peak_rss_kb': 10},
+               'c': {'rate': 10.0, 'peak_rss_kb': 10}}
+    baseline = {'a': {'rate': 100.0, 'peak_rss_kb': 9},
+                'b': {'rate': 100.0, 'peak_rss_kb': 9}}
+    (lines, slow) = bench.compare(results, baseline, tolerance=20)
+    assert slow == ['a']
+    assert len(lines) == 3
+    assert "no baseline" in lines[2]
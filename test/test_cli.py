@@ -0,0 +1,104 @@
+from fx import __main__ as fxmain
+from fx import cli
+import docopt
+import pytest
+
+
+# -----------------------------------------------------------------------------
+def outcome(parse, argv, capsys):
+    """
+    What *parse* makes of *argv*: ('ok', the result) or ('exit', the exit
+    message, what was printed)
+    """
+    try:
+        return ('ok', dict(parse(fxmain.__doc__, argv)))
+    except SystemExit as exc:
+        return ('exit', exc.code, capsys.readouterr().out)
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("argv", [
+    "cmd 'echo %' a b", "-n cmd x a", "-nq cmd x a", "-j4 cmd x a",
+    "-j 4 cmd x a", "cmd x a -q -j 2", "cmd x", "cmd", "cmd x -- -a -b",
+    "cmd x - a", "-L cmd x a", "-0 cmd x a", "-e cmd x a", "-i 1 cmd x a",
+    "xargs 'echo %'", "-0 xargs x", "-L xargs x", "xargs x y",
+    "--max-a=3 xargs x", "--max xargs x", "--pack=1 xargs x",
+    "--stats-j f xargs x", "count x -i 1:3", "count -i 1:3 x", "count x",
+    "count x -i", "count x -i 1 -i 2", "--pack count x -i 1:3 --max-args 3",
+    "--format %04d count x -i 1:3", "--journal f count x -i 1:2",
+    "rename -e s/a/b/", "rename -e s/a/b/ f g", "rename s/a/b/",
+    "-q -j 2 rename -e s/a/b/ f", "--pack rename -e x", "version",
+    "--profile p rename -e s/a/b/ f", "rename --profile p",
+    "-d version", "-n version", "version x", "help", "", "-j", "-ij cmd",
+    "--foo cmd x a", "-z cmd x a", "-n -n cmd x a", "--timeout 3 cmd x a",
+    "--timeout=3 --stats --stats-json f cmd x a",
+    "--incremental f --checksum cmd x a",
+    "--resume f --trace t --profile p cmd x a",
+    "--coproc --asyncio --group --keep-order --no-shell cmd x a",
+    "--help", "-h", "cmd x a --help",
+    ])
+def test_like_docopt(argv, capsys):
+    """
+    fx's usage message is understood just as docopt understands it, errors
+    and --help included
+    """
+    pytest.dbgfunc()
+    argv = argv.replace("'echo %'", "echo_%").split()
+    exp = outcome(docopt.docopt, argv, capsys)
+    assert outcome(lambda doc, argv: cli.Parser(doc).parse(argv), argv,
+                   capsys) == exp
+
+
+# -----------------------------------------------------------------------------
+def test_defaults():
+    """
+    '[default: ...]' in an option's description is its value when it isn't
+    given
+    """
+    pytest.dbgfunc()
+    doc = """
+    Usage:
+        prog [--size N] go
+
+    Options:
+        --size N  how big [default: 12]
+    """
+    assert cli.Parser(doc).parse(["go"]) == {'--size': '12', 'go': True}
+    assert cli.Parser(doc).parse(["go", "--size=3"])['--size'] == '3'
+
+
+# -----------------------------------------------------------------------------
+def test_dispatch():
+    """
+    The first handler whose words are all set is called with the results as
+    keywords named the way docopt_dispatch names them
+    """
+    pytest.dbgfunc()
+    doc = """
+    Usage:
+        prog [--max-chars N] [-0] run NAME
+        prog list
+
+    Options:
+        --max-chars N  how long
+        -0             NUL separated
+    """
+    dispatch = cli.Dispatch()
+    calls = []
+
+    @dispatch.on('run')
+    def run(**kw):
+        calls.append(('run', kw))
+
+    @dispatch.on('list')
+    def ls(**kw):
+        calls.append(('list', kw))
+
+    dispatch(doc, ["-0", "run", "--max-c", "5", "x"])
+    dispatch(doc, ["list"])
+    assert calls == [
+        ('run', {'max_chars': '5', '0': True, 'run': True, 'NAME': 'x',
+                 'list': False}),
+        ('list', {'max_chars': None, '0': False, 'run': False, 'NAME': None,
+                  'list': True}),
+        ]
@@ -0,0 +1,101 @@
+from fx import coproc
+import os
+import pytest
+import tempfile
+
+
+# -----------------------------------------------------------------------------
+def run(shell, cmd):
+    """
+    Run *cmd* in *shell* and return (status, output)
+    """
+    with tempfile.TemporaryFile() as out:
+        status = shell.run(cmd, out.fileno())
+        out.seek(0)
+        return (status, out.read().decode())
+
+
+# -----------------------------------------------------------------------------
+def test_shell_run():
+    """
+    One shell runs command after command, keeping each one's output and exit
+    status apart, whether or not the output ends with a newline
+    """
+    pytest.dbgfunc()
+    shell = coproc.Shell()
+    pid = shell.proc.pid
+    assert run(shell, "echo one") == (0, "one\n")
+    assert run(shell, "printf two; (exit 3)") == (3, "two")
+    assert run(shell, "true") == (0, "")
+    assert run(shell, "head -c 200000 /dev/zero | tr '\\0' x") == (
+        0, "x" * 200000)
+    assert shell.proc.pid == pid
+    shell.close()
+
+
+# -----------------------------------------------------------------------------
+def test_shell_stdin():
+    """
+    Commands can't read the script the shell is being fed
+    """
+    pytest.dbgfunc()
+    shell = coproc.Shell()
+    assert run(shell, "cat") == (0, "")
+    assert run(shell, "echo after") == (0, "after\n")
+    shell.close()
+
+
+# -----------------------------------------------------------------------------
+def test_shell_cwd(tmpdir):
+    """
+    The working directory is put back after each command
+    """
+    pytest.dbgfunc()
+    shell = coproc.Shell()
+    here = os.getcwd()
+    assert run(shell, "cd {}; pwd".format(tmpdir.strpath))[0] == 0
+    assert run(shell, "pwd") == (0, here + "\n")
+    shell.close()
+
+
+# -----------------------------------------------------------------------------
+def test_shells_restart():
+    """
+    A command that makes the shell exit fails with the shell's status, and a
+    new shell takes over
+    """
+    pytest.dbgfunc()
+    shells = coproc.Shells()
+    assert run(shells.get(), "echo bye; exit 4") == (4, "bye\n")
+    assert run(shells.get(), "echo hello") == (0, "hello\n")
+    assert len(shells.shells) == 2
+    shells.close()
+
+
+# -----------------------------------------------------------------------------
+def test_shells_unbalanced():
+    """
+    A command that doesn't parse fails, as it would with a shell of its own,
+    rather than leaving the shell waiting for the rest of it
+    """
+    pytest.dbgfunc()
+    shells = coproc.Shells()
+    (status, _) = run(shells.get(), "echo Bob's")
+    assert status == 2
+    assert run(shells.get(), "cat <<EOF\nheredoc\nEOF") == (0, "heredoc\n")
+    shells.close()
+
+
+# -----------------------------------------------------------------------------
+def test_shell_exec(tmpdir):
+    """
+    A command that sends the shell's stdout elsewhere with 'exec' has it put
+    back for the next command
+    """
+    pytest.dbgfunc()
+    shell = coproc.Shell()
+    path = tmpdir.join("out")
+    assert run(shell, "exec >{}; echo moved".format(path.strpath)) == (0, "")
+    assert run(shell, "echo back") == (0, "back\n")
+    assert path.read() == "moved\n"
+    shell.close()
@@ -0,0 +1,82 @@
+from fx import engine
+from fx import journal
+import contextlib
+import io
+import json
+import pytest
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("how", [{}, {'jobs': 3}, {'asyncio': True}])
+def test_run(how, capfd):
+    """
+    run() makes a command of the template for each item and yields a Result
+    for each, with either engine
+    """
+    pytest.dbgfunc()
+    results = list(engine.run(["a", "b", "c"], "echo %", quiet=True, **how))
+    assert sorted(r.cmd for r in results) == ["echo a", "echo b", "echo c"]
+    assert [r.status for r in results] == [0, 0, 0]
+    assert sorted(capfd.readouterr().out.split()) == ["a", "b", "c"]
+
+
+# -----------------------------------------------------------------------------
+def test_run_pack_argv(capfd):
+    """
+    With pack, items are bundled as xargs does; without a shell, commands
+    are argument lists
+    """
+    pytest.dbgfunc()
+    results = list(engine.run(["1", "2", "3", "4", "5"], "echo % end",
+                              quiet=True, shell=False, pack=True,
+                              max_args=2))
+    assert [r.cmd for r in results] == [["echo", "1", "2", "end"],
+                                        ["echo", "3", "4", "end"],
+                                        ["echo", "5", "end"]]
+    assert capfd.readouterr().out == "1 2 end\n3 4 end\n5 end\n"
+
+
+# -----------------------------------------------------------------------------
+def test_redirected():
+    """
+    When sys.stdout isn't a file, the commands' output still ends up there,
+    each after the command itself
+    """
+    pytest.dbgfunc()
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        statuses = [r.status for r in engine.run(["one", "two"], "echo %")]
+    assert statuses == [0, 0]
+    assert out.getvalue() == "echo one\none\necho two\ntwo\n"
+
+
+# -----------------------------------------------------------------------------
+def test_execute_journal_trace(tmpdir, capfd):
+    """
+    execute() keeps the journal and writes the trace; with resume, commands
+    that succeeded before are skipped
+    """
+    pytest.dbgfunc()
+    jnl = tmpdir.join("jnl").strpath
+    trace = tmpdir.join("trace.json").strpath
+    first = list(engine.execute(["true", "exit 2"], quiet=True, journal=jnl,
+                                trace=trace))
+    assert sorted(r.status for r in first) == [0, 2]
+    assert journal.succeeded(jnl) == {journal.key("true")}
+    with open(trace) as rbl:
+        events = json.load(rbl)
+    assert sum(1 for event in events if event.get('cat') == 'job') == 2
+    again = list(engine.execute(["true", "exit 2"], quiet=True, resume=jnl))
+    assert [r.cmd for r in again] == ["exit 2"]
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("how", [{'jobs': 0},
+                                 {'coproc': True, 'timeout': 1.0}])
+def test_execute_invalid(how):
+    """
+    Options that can't be used are reported before anything runs
+    """
+    pytest.dbgfunc()
+    with pytest.raises(ValueError):
+        engine.execute(["true"], **how)
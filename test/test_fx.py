@@ -1,12 +1,23 @@
 import fx
 import glob
 import io
+import json
 import re
 import os
+import subprocess
+import sys
 import tbx
+import time
 import pytest
 
 
+FXDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fx")
+
+# How much longer than a bare python 'fx version' may take to start, in
+# seconds. Importing everything up front took about 0.14s.
+STARTUP = 0.06
+
+
 # -----------------------------------------------------------------------------
 def test_flake():
     """
@@ -104,7 +115,8 @@ def test_xw_nopct_file(fx_batch):
 
         'foo item1 item2 item3 ... itemn bar'
 
-    such that the strings are only minimally longer than 240 bytes. This is
+    such that the strings are as long as they can be without going over
+    max_chars bytes. This is
     like xargs except that I've never figured out a way to get xargs to embed
     stuff in the middle of the command -- it only wants to put stuff at the
     end.
@@ -115,7 +127,7 @@ def test_xw_nopct_file(fx_batch):
     pytest.dbgfunc()
     tmppath, data = fx_batch
     with open(tmppath, 'r') as fobj:
-        result = fx.xargs_wrap("echo", fobj)
+        result = list(fx.xargs_wrap("echo", fobj, 240))
     assert result == data
 
 
@@ -128,7 +140,7 @@ def test_xw_nopct_sio(fx_batch):
     fobj = io.StringIO("".join(["{}\n".format(idx)
                                 for idx in range(1, 250)]))
     tmppath, data = fx_batch
-    result = fx.xargs_wrap("echo", fobj)
+    result = list(fx.xargs_wrap("echo", fobj, 240))
     assert result == data
 
 
@@ -139,9 +151,9 @@ def test_xw_pct_file(fx_batch):
     """
     pytest.dbgfunc()
     tmppath, data = fx_batch
-    data = exp_xargs_data("echo ", [83, 146, 205, 250])
+    data = exp_xargs_data("echo ", [82, 145, 204, 250])
     with open(tmppath, 'r') as fobj:
-        result = fx.xargs_wrap("echo %", fobj)
+        result = list(fx.xargs_wrap("echo %", fobj, 240))
     assert result == data
 
 
@@ -154,11 +166,120 @@ def test_xw_pct_sio(fx_batch):
     fobj = io.StringIO("".join(["{}\n".format(idx)
                                 for idx in range(1, 250)]))
     tmppath, data = fx_batch
-    data = exp_xargs_data("echo ", [83, 146, 205, 250])
-    result = fx.xargs_wrap("echo %", fobj)
+    data = exp_xargs_data("echo ", [82, 145, 204, 250])
+    result = list(fx.xargs_wrap("echo %", fobj, 240))
     assert result == data
 
 
+# -----------------------------------------------------------------------------
+def test_xw_streaming():
+    """
+    xargs_wrap should hand back each command line as soon as it's full,
+    without reading ahead to the end of its input.
+    """
+    pytest.dbgfunc()
+
+    def lines():
+        for idx in range(1, 250):
+            yield "{}\n".format(idx)
+        raise AssertionError("xargs_wrap read past the first batch")
+
+    batches = fx.xargs_wrap("echo %", lines(), 240)
+    assert next(batches) == exp_xargs_data("echo ", [82])[0]
+
+
+# -----------------------------------------------------------------------------
+def test_xw_max_args():
+    """
+    With max_args, no command line gets more than that many items
+    """
+    pytest.dbgfunc()
+    fobj = io.StringIO("".join(["{}\n".format(idx)
+                                for idx in range(1, 250)]))
+    result = list(fx.xargs_wrap("echo % end", fobj, max_args=100))
+    assert [len(cmd.split()) - 2 for cmd in result] == [100, 100, 49]
+    assert all(cmd.endswith(" end") for cmd in result)
+
+
+# -----------------------------------------------------------------------------
+def test_arg_max():
+    """
+    arg_max() leaves room for the environment and, on Linux, fits within the
+    single argument limit since the command line goes to 'sh -c'
+    """
+    pytest.dbgfunc()
+    limit = fx.arg_max()
+    assert 2048 < limit
+    if sys.platform.startswith('linux'):
+        assert limit < fx.MAX_ARG_STRLEN
+    assert limit <= fx.arg_max(shell=False)
+
+
+# -----------------------------------------------------------------------------
+def test_xw_default_limit(monkeypatch):
+    """
+    By default, command lines are sized by arg_max()
+    """
+    pytest.dbgfunc()
+    monkeypatch.setattr(fx, 'arg_max', lambda shell=True: 100)
+    fobj = io.StringIO("".join(["{}\n".format(idx)
+                                for idx in range(1, 250)]))
+    result = list(fx.xargs_wrap("echo %", fobj))
+    assert 1 < len(result)
+    assert all(len(cmd) <= 100 for cmd in result)
+    assert all(95 < len(cmd) for cmd in result[:-1])
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("data, sep, exp", [
+    ("one  two\n  three\n", None, "echo [one] [two] [three]"),
+    ("one  two\n  three\n", "\n", "echo [one  two] [  three]"),
+    ("one two\0three\n\0", "\0", "echo [one two] [three\n]"),
+    ])
+def test_xw_sep(data, sep, exp):
+    """
+    Items are whitespace separated words by default (with no empty items
+    from repeated spaces), or whole lines, or NUL separated
+    """
+    pytest.dbgfunc()
+    result = list(fx.xargs_wrap("echo [%]", io.StringIO(data), sep=sep))
+    assert result == [exp]
+
+
+# -----------------------------------------------------------------------------
+def test_xargs_nul():
+    """
+    'fx xargs -0 --no-shell' keeps items with spaces in them whole
+    """
+    pytest.dbgfunc()
+    result = tbx.run("python fx xargs -q -0 --no-shell 'echo [%]'",
+                     input="one  two\0three\0")
+    assert result == "[one  two] [three]\n"
+
+
+# -----------------------------------------------------------------------------
+def test_xargs_max_chars():
+    """
+    'fx xargs --max-chars' bounds the length of the command lines
+    """
+    pytest.dbgfunc()
+    ilst = ["item{:02d}".format(idx) for idx in range(12)]
+    result = tbx.run("python fx xargs -n --max-chars 30 \"echo %\"",
+                     input="\n".join(ilst))
+    exp = "".join("would do 'echo {}'\n".format(" ".join(ilst[lo:lo+3]))
+                  for lo in range(0, 12, 3))
+    assert result == exp
+
+
+# -----------------------------------------------------------------------------
+def test_xw_empty():
+    """
+    No input means no command lines
+    """
+    pytest.dbgfunc()
+    assert list(fx.xargs_wrap("echo %", io.StringIO(""))) == []
+
+
 # -----------------------------------------------------------------------------
 def test_xargs_cmdl_stdin(tmpdir):
     """
@@ -175,15 +296,462 @@ def test_xargs_cmdl_stdin(tmpdir):
     assert result == exp
 
 
+# -----------------------------------------------------------------------------
+def test_cmd_jobs(tmpdir):
+    """
+    Run 'fx cmd -j 3 -q "echo %" ...'. Each command's output should show up
+    exactly once, though not necessarily in order.
+    """
+    pytest.dbgfunc()
+    ilst = ["item{}".format(idx) for idx in range(10)]
+    result = tbx.run("python fx cmd -j 3 -q \"echo %\" {}".format(
+        " ".join(ilst)))
+    assert sorted(result.split()) == sorted(ilst)
+
+
+# -----------------------------------------------------------------------------
+def test_cmd_no_shell():
+    """
+    With --no-shell, a file name with spaces in it stays one argument and
+    nothing in it is interpreted by a shell
+    """
+    pytest.dbgfunc()
+    result = tbx.run("python fx cmd --no-shell -q -j 1 'echo [%]' "
+                     "'a  b' '$HOME;'")
+    assert result == "[a  b]\n[$HOME;]\n"
+
+
+# -----------------------------------------------------------------------------
+def test_xargs_no_shell():
+    """
+    'fx xargs --no-shell -n' shows the argument lists it would run, quoted
+    for the shell
+    """
+    pytest.dbgfunc()
+    result = tbx.run("python fx xargs -n --no-shell \"echo '%' end\"",
+                     input="one two\nthree")
+    assert result == "would do 'echo one two three end'\n"
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("args, exp", [
+    (["cmd", "--no-shell", "echo 'a", "f"],
+     "fx cmd: can't split 'echo 'a' into arguments: no closing quotation"),
+    (["xargs", "mv % %.bak"],
+     "fx xargs: only one word of 'mv % %.bak' may contain '%'"),
+    (["count", "--pack", "--no-shell", "mv % %.bak", "-i", "1:5"],
+     "fx count: only one argument of 'mv % %.bak' may contain '%'"),
+    ])
+def test_bad_template(args, exp):
+    """
+    A command template that can't be used is reported before anything runs
+    """
+    pytest.dbgfunc()
+    result = subprocess.run(["python", "fx"] + args, input="a b\n",
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    assert result.returncode == 1
+    assert result.stdout == ""
+    assert result.stderr == exp + "\n"
+
+
+# -----------------------------------------------------------------------------
+def test_count_keep_order():
+    """
+    With --keep-order, each command's output comes out in one piece and in
+    the order of the range, however long each one takes
+    """
+    pytest.dbgfunc()
+    result = tbx.run("python fx count -j 4 --keep-order "
+                     "'sleep 0.0%; echo a%; sleep 0.0%; echo b%' -i 1:6")
+    exp = ["sleep 0.0{0}; echo a{0}; sleep 0.0{0}; echo b{0}\na{0}\nb{0}\n"
+           .format(idx) for idx in range(6, 0, -1)]
+    assert result == "".join(reversed(exp))
+
+
+# -----------------------------------------------------------------------------
+def test_cmd_incremental(tmpdir):
+    """
+    'fx cmd --incremental' runs the command only on files that are new or
+    have changed, or whose command has, since it last succeeded on them
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        for name in ["a", "b", "c"]:
+            with open(name, "w") as wbl:
+                wbl.write(name)
+        cmd = ("python {} cmd -q -j 1 --incremental idx 'echo %' a b c"
+               .format(FXDIR))
+        assert tbx.run(cmd).split() == ["a", "b", "c"]
+        assert tbx.run(cmd).split() == []
+        with open("b", "a") as wbl:
+            wbl.write("more")
+        assert tbx.run(cmd).split() == ["b"]
+        assert tbx.run(cmd.replace("echo", "echo x")).split() == [
+            "x", "a", "x", "b", "x", "c"]
+        fail = ("python {} cmd -q -j 1 --incremental idx 'test % = a' a b"
+                .format(FXDIR))
+        tbx.run(fail)
+        assert tbx.run(fail.replace("-q", "-n")).split() == [
+            "would", "do", "'test", "b", "=", "a'"]
+
+
+# -----------------------------------------------------------------------------
+def test_count_ranges():
+    """
+    'fx count' takes steps, lists and combinations of values, and a format
+    for the numbers
+    """
+    pytest.dbgfunc()
+    result = tbx.run("python fx count -n -j 1 --format %03d 'echo %' "
+                     "-i '1:9:4|20,a|b'")
+    assert result.split("\n")[:-1] == [
+        "would do 'echo {}'".format(value)
+        for value in ["001a", "001b", "005a", "005b", "009a", "009b",
+                      "020a", "020b"]]
+    result = tbx.run("python fx count -n 'echo %' -i 1:x")
+    assert "1:x is not low:high or low:high:step" in result
+
+
+# -----------------------------------------------------------------------------
+def test_count_pack():
+    """
+    'fx count --pack' puts as many values on each command line as fit,
+    just as 'fx xargs' does
+    """
+    pytest.dbgfunc()
+    result = tbx.run("python fx count -n --pack --max-args 4 'echo % end' "
+                     "-i 1:10")
+    assert result.split("\n")[:-1] == [
+        "would do 'echo 1 2 3 4 end'",
+        "would do 'echo 5 6 7 8 end'",
+        "would do 'echo 9 10 end'",
+        ]
+    result = tbx.run("python fx count -q -j 1 --pack --max-chars 20 echo "
+                     "-i 1:20")
+    lines = result.split("\n")[:-1]
+    assert " ".join(lines).split() == [str(num) for num in range(1, 21)]
+    assert 1 < len(lines)
+    assert all(len("echo " + line) <= 20 for line in lines)
+
+
+# -----------------------------------------------------------------------------
+def test_count_resume(tmpdir):
+    """
+    'fx count --resume' skips the commands its journal says succeeded and
+    runs the rest, failures included
+    """
+    pytest.dbgfunc()
+
+    def ran():
+        with open("log") as rble:
+            rval = rble.read().split()
+        os.unlink("log")
+        return rval
+
+    with tbx.chdir(tmpdir.strpath):
+        cmd = ("python {} count -q -j 1 {{}} jnl 'echo % >> log; test -f ok%'"
+               " -i 1:4".format(FXDIR))
+        with open("ok2", "w"):
+            pass
+        tbx.run(cmd.format("--journal"))
+        assert ran() == ["1", "2", "3", "4"]
+        with open("ok3", "w"):
+            pass
+        tbx.run(cmd.format("--resume"))
+        assert ran() == ["1", "3", "4"]
+        tbx.run(cmd.format("--resume"))
+        assert ran() == ["1", "4"]
+
+
+# -----------------------------------------------------------------------------
+def test_count_resume_cut_short(tmpdir):
+    """
+    A journal whose last line was cut short is added to on a fresh line, so
+    resuming from it skips what's been done since
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        with open("jnl", "w") as wbl:
+            wbl.write('{"cmd": "echo 1", "sta')
+        cmd = "python {} count -q -j 1 {{}} jnl 'echo %' -i 1:2".format(FXDIR)
+        assert tbx.run(cmd.format("--journal")) == "1\n2\n"
+        assert tbx.run(cmd.format("--resume")) == ""
+
+
+# -----------------------------------------------------------------------------
+def test_cmd_timeout():
+    """
+    'fx cmd --timeout' stops commands that run too long and fails, and a
+    timeout that isn't a number of seconds is reported
+    """
+    pytest.dbgfunc()
+    result = subprocess.run(["python", "fx", "cmd", "-q", "-j", "2",
+                             "--timeout", "0.5", "sleep %; echo %", "0", "30"],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    assert result.returncode == 1
+    assert result.stdout == "0\n"
+    assert "fx: timed out after 0.5s: sleep 30; echo 30" in result.stderr
+    for value in ("soon", "0", "-1", "nan"):
+        result = subprocess.run(["python", "fx", "count", "--timeout", value,
+                                 "echo %", "-i", "1:5"],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        assert result.returncode == 1
+        assert result.stdout == ""
+        assert "fx: --timeout must be a number of seconds" in result.stderr
+
+
+# -----------------------------------------------------------------------------
+def test_count_adaptive():
+    """
+    'fx count --max-load --min-free-mem' runs every command when the machine
+    isn't busy, and a size or load that isn't one is reported
+    """
+    pytest.dbgfunc()
+    result = subprocess.run(["python", "fx", "count", "-q", "-j", "3",
+                             "--max-load", "100000", "--min-free-mem", "1K",
+                             "--keep-order", "echo %", "-i", "1:5"],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    assert result.returncode == 0
+    assert result.stdout == "1\n2\n3\n4\n5\n"
+    result = subprocess.run(["python", "fx", "count", "--min-free-mem", "lots",
+                             "echo %", "-i", "1:5"],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    assert result.returncode == 1
+    assert "fx: lots is not a size" in result.stderr
+    for value in ("x", "-1", "nan", "inf"):
+        result = subprocess.run(["python", "fx", "count", "--max-load", value,
+                                 "echo %", "-i", "1:5"],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        assert result.returncode == 1
+        assert result.stdout == ""
+        assert result.stderr == ("fx: --max-load must be a load average, a "
+                                 "number at least 0, not {}\n".format(value))
+
+
+# -----------------------------------------------------------------------------
+def test_count_stats(tmpdir):
+    """
+    'fx count --stats' reports on the run to stderr and --stats-json writes
+    the numbers to a file
+    """
+    pytest.dbgfunc()
+    path = tmpdir.join("stats.json")
+    result = subprocess.run(["python", "fx", "count", "-q", "-j", "2",
+                             "--group", "--stats", "--stats-json",
+                             path.strpath, "echo %; exit %", "-i", "0:3"],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    assert result.returncode == 1
+    assert sorted(result.stdout.split()) == ["0", "1", "2", "3"]
+    assert "fx: 4 jobs (3 failed)" in result.stderr
+    assert "slowest:" in result.stderr
+    summary = json.loads(path.read())
+    assert summary['jobs'] == 4
+    assert summary['processes'] == 4
+    assert summary['output_bytes'] == 8
+    assert len(summary['slowest']) == 4
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("option", ["--stats-json", "--trace", "--journal",
+                                    "--resume"])
+def test_count_unwritable(tmpdir, option):
+    """
+    A file for --stats-json, --trace, --journal or --resume that can't be
+    written is reported before any command runs
+    """
+    pytest.dbgfunc()
+    for (path, problem) in [(tmpdir.join("no", "such").strpath,
+                             "no such directory"),
+                            (tmpdir.strpath, "is a directory")]:
+        result = subprocess.run(["python", "fx", "count", option, path,
+                                 "echo %", "-i", "1:2"],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        assert result.returncode == 1
+        assert result.stdout == ""
+        assert result.stderr == "fx: {} {}: {}\n".format(option, path,
+                                                           problem)
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("engine", ["", "--asyncio"])
+def test_count_trace(tmpdir, engine):
+    """
+    'fx count --trace' writes a job, spawn and run span for each command on
+    its worker's track, and flush spans with --group
+    """
+    pytest.dbgfunc()
+    path = tmpdir.join("trace.json")
+    tbx.run("python fx count -q -j 2 --group {} --trace {} 'echo %' -i 1:5"
+            .format(engine, path.strpath))
+    events = json.loads(path.read())
+    spans = [event for event in events if event['ph'] == 'X']
+    for cat in ['job', 'spawn', 'run', 'flush']:
+        assert len([span for span in spans if span['cat'] == cat]) == 5
+    assert {span['tid'] for span in spans if span['cat'] == 'job'} <= {1, 2}
+    assert all(0 <= span['dur'] for span in spans)
+
+
+# -----------------------------------------------------------------------------
+def test_count_profile(tmpdir):
+    """
+    'fx count --profile' writes cProfile stats and reports fx's timers
+    """
+    pytest.dbgfunc()
+    path = tmpdir.join("fx.prof")
+    result = subprocess.run(["python", "fx", "count", "-q", "-j", "2",
+                             "--profile", path.strpath, "true %",
+                             "-i", "1:5"],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    assert result.returncode == 0
+    assert path.check()
+    timers = [line.split()[:2] for line in result.stderr.splitlines()[1:]]
+    assert ["render", "5"] in timers
+    assert ["spawn", "5"] in timers
+
+
+# -----------------------------------------------------------------------------
+def test_rename_profile(tmpdir):
+    """
+    'fx rename --profile' profiles the renaming too
+    """
+    pytest.dbgfunc()
+    for name in ("a1", "a2"):
+        tmpdir.join(name).write(name)
+    path = tmpdir.join("fx.prof")
+    with tbx.chdir(tmpdir.strpath):
+        result = subprocess.run(["python", FXDIR, "rename", "-q",
+                                 "--profile", path.strpath, "-e", "s/a/b/",
+                                 "a1", "a2"],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True)
+    assert result.returncode == 0
+    assert path.check()
+    assert tmpdir.join("b1").check() and tmpdir.join("b2").check()
+    timers = [line.split()[:2] for line in result.stderr.splitlines()[1:]]
+    assert ["check", "1"] in timers
+    assert ["rename", "1"] in timers
+
+
+# -----------------------------------------------------------------------------
+def test_count_coproc(tmpdir):
+    """
+    'fx count --coproc' runs the commands in long-lived shells, with each
+    command's output and exit status kept separate
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        result = tbx.run("python {} count -q -j 2 --keep-order --coproc "
+                         "'touch f%; printf %' -i 1:4".format(FXDIR))
+        assert sorted(os.listdir(".")) == ["f1", "f2", "f3", "f4"]
+    assert result == "1234"
+
+
+# -----------------------------------------------------------------------------
+def test_count_jobs_dryrun():
+    """
+    With -n, 'fx count -j 4' should show the commands in order without running
+    them.
+    """
+    pytest.dbgfunc()
+    exp = "".join("would do 'echo {}'\n".format(idx) for idx in range(1, 6))
+    result = tbx.run("python fx count -n -j 4 \"echo %\" -i 1:5")
+    assert result == exp
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("args, exp", [
+    (["xargs", "--incremental", "idx", "echo"],
+     "fx xargs: --incremental only applies to cmd"),
+    (["count", "--incremental", "idx", "--checksum", "echo %", "-i", "1:2"],
+     "fx count: --incremental only applies to cmd"),
+    (["cmd", "--checksum", "echo %", "1"],
+     "fx cmd: --checksum only applies with --incremental"),
+    (["cmd", "--pack", "--format", "%05d", "--max-args", "1", "echo %", "1"],
+     "fx cmd: --pack only applies to count"),
+    (["xargs", "--format", "%05d", "echo"],
+     "fx xargs: --format only applies to count"),
+    (["count", "--max-args", "1", "echo %", "-i", "1:2"],
+     "fx count: --max-args only applies with --pack"),
+    (["cmd", "-L", "echo %", "1"], "fx cmd: -L only applies to xargs"),
+    (["rename", "--stats", "-e", "s/a/b/", "f"],
+     "fx rename: --stats only applies to cmd, xargs and count"),
+    ])
+def test_inapplicable(args, exp, tmpdir):
+    """
+    An option the command doesn't have is reported rather than ignored
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        result = subprocess.run(["python", FXDIR] + args, input="",
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        assert not os.path.exists("idx")
+    assert result.returncode == 1
+    assert result.stdout == ""
+    assert result.stderr == exp + "\n"
+
+
+# -----------------------------------------------------------------------------
+def test_whole_number():
+    """
+    whole_number() takes a whole number of at least 1, or nothing for the
+    default, and exits with a usage message on anything else
+    """
+    pytest.dbgfunc()
+    assert fx.whole_number("12", "--max-args") == 12
+    assert fx.whole_number(None, "--max-args") is None
+    assert fx.whole_number("", "-j", 4) == 4
+    for text in ("0", "-3", "x", "1.5"):
+        with pytest.raises(SystemExit) as err:
+            fx.whole_number(text, "--max-args")
+        assert str(err.value) == ("--max-args must be a whole number, at "
+                                  "least 1, not {}".format(text))
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("args, option", [
+    (["count", "-j", "x", "echo %", "-i", "1:5"], "-j"),
+    (["count", "-j", "0", "echo %", "-i", "1:5"], "-j"),
+    (["rename", "-j", "x", "-e", "s/a/b/", "nosuchfile"], "-j"),
+    (["xargs", "--max-chars", "x", "echo"], "--max-chars"),
+    (["xargs", "--max-args", "-3", "echo"], "--max-args"),
+    (["xargs", "--max-chars", "0", "echo"], "--max-chars"),
+    (["count", "--pack", "--max-args", "1.5", "echo", "-i", "1:2"],
+     "--max-args"),
+    ])
+def test_bad_numbers(args, option):
+    """
+    A -j, --max-args or --max-chars that isn't a whole number of at least 1
+    is reported, not a traceback
+    """
+    pytest.dbgfunc()
+    result = subprocess.run(["python", "fx"] + args, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    assert result.returncode == 1
+    assert result.stdout == ""
+    assert result.stderr.startswith("{} must be a whole number, at least 1"
+                                    .format(option))
+
+
 # -----------------------------------------------------------------------------
 def test_batch_command_both(tmpdir, capsys, fx_batch):
     """
     Test batch_command with dryrun True and quiet True.
     """
     pytest.dbgfunc()
-    v = {'-n': True, '-q': True, '-x': True, 'COMMAND': "echo %"}
+    v = {'-n': True, '-q': True, '-x': True, 'COMMAND': "echo %",
+         '--max-chars': 240}
     tmppath, data = fx_batch
-    data = exp_xargs_data("would do 'echo ", [83, 146, 205, 250])
+    data = exp_xargs_data("would do 'echo ", [82, 145, 204, 250])
     exp = "".join("{}'\n".format(line) for line in data)
     with open(tmppath, "r") as f:
         fx.batch_command(v, [], f)
@@ -196,9 +764,10 @@ def test_batch_command_dryrun(tmpdir, capsys, fx_batch):
     Test batch_command with dryrun True and quiet False.
     """
     pytest.dbgfunc()
-    v = {'-n': True, '-q': False, '-x': True, 'COMMAND': "echo %"}
+    v = {'-n': True, '-q': False, '-x': True, 'COMMAND': "echo %",
+         '--max-chars': 240}
     tmppath, data = fx_batch
-    data = exp_xargs_data("would do 'echo ", [83, 146, 205, 250])
+    data = exp_xargs_data("would do 'echo ", [82, 145, 204, 250])
     exp = "".join("{}'\n".format(line) for line in data)
     with open(tmppath, 'r') as f:
         fx.batch_command(v, [], f)
@@ -211,9 +780,10 @@ def test_batch_command_neither(tmpdir, capsys, fx_batch):
     Test batch_command with dryrun and quiet both False.
     """
     pytest.dbgfunc()
-    v = {'-n': False, '-q': False, '-x': True, 'COMMAND': "echo %"}
+    v = {'-n': False, '-q': False, '-x': True, 'COMMAND': "echo %",
+         '--max-chars': 240}
     tmppath, data = fx_batch
-    data = exp_xargs_data("", [83, 146, 205, 250])
+    data = exp_xargs_data("", [82, 145, 204, 250])
     exp = ''
     for line in data:
         exp += "echo {}\n".format(line)
@@ -230,9 +800,10 @@ def test_batch_command_quiet(tmpdir, capsys, fx_batch):
     Test batch_command with dryrun False and quiet True.
     """
     pytest.dbgfunc()
-    v = {'-n': False, '-q': True, '-x': True, 'COMMAND': "echo %"}
+    v = {'-n': False, '-q': True, '-x': True, 'COMMAND': "echo %",
+         '--max-chars': 240}
     tmppath, data = fx_batch
-    data = exp_xargs_data("", [83, 146, 205, 250])
+    data = exp_xargs_data("", [82, 145, 204, 250])
     exp = ''
     for line in data:
         exp += "{}\n".format(line)
@@ -249,10 +820,11 @@ def test_fx_short_help():
     """
     pytest.dbgfunc()
     exp_l = ["Usage:",
-             "    fx [-d] [-n] [-q] cmd COMMAND FILE ...",
-             "    fx [-d] [-n] [-q] xargs COMMAND",
-             "    fx [-d] [-n] [-q] count COMMAND -i RANGE",
-             "    fx [-d] [-n] [-q] rename -e SUBSTITUTION FILE ...",
+             "    fx [-d] [-n] [-q] [-j N] [options] cmd COMMAND FILE ...",
+             "    fx [-d] [-n] [-q] [-j N] [-0] [options] xargs COMMAND",
+             "    fx [-d] [-n] [-q] [-j N] [options] count COMMAND -i RANGE",
+             "    fx [-d] [-n] [-q] [-j N] [-0] [options] rename -e "
+             "SUBSTITUTION [FILE ...]",
              "    fx [-d] version",
              ]
     result = tbx.run("python fx help")
@@ -266,19 +838,73 @@ def test_fx_long_help():
     """
     pytest.dbgfunc()
     exp_l = ["Usage:",
-             "    fx [-d] [-n] [-q] cmd COMMAND FILE ...",
-             "    fx [-d] [-n] [-q] xargs COMMAND",
-             "    fx [-d] [-n] [-q] count COMMAND -i RANGE",
-             "    fx [-d] [-n] [-q] rename -e SUBSTITUTION FILE ...",
+             "    fx [-d] [-n] [-q] [-j N] [options] cmd COMMAND FILE ...",
+             "    fx [-d] [-n] [-q] [-j N] [-0] [options] xargs COMMAND",
+             "    fx [-d] [-n] [-q] [-j N] [options] count COMMAND -i RANGE",
+             "    fx [-d] [-n] [-q] [-j N] [-0] [options] rename -e "
+             "SUBSTITUTION [FILE ...]",
              "    fx [-d] version",
              "",
              "Options:",
-             "    -d        debug -- run the python debugger",
-             "    -n        dryrun -- just show what would happen",
-             "    -q        quiet -- don't echo commands before running them",
-             "    -e        SUBSTITUTION -- a substitute expression: "
+             "    -d             debug -- run the python debugger",
+             "    -n             dryrun -- just show what would happen",
+             "    -q             quiet -- don't echo commands before running "
+             "them",
+             "    -e             SUBSTITUTION -- a substitute expression: "
              "s/foo/bar/",
-             "    -i RANGE  <low number>:<high number>",
+             "    -i RANGE       <low>:<high>[:<step>]; list several with |, "
+             "combine with ,",
+             "    -0             items on stdin are NUL separated "
+             "(default: one per line",
+             "                   for rename, separated by whitespace for "
+             "xargs)",
+             "    -L             xargs: each line on stdin is one item",
+             "    -j N           jobs -- run up to N commands at once "
+             "(default: # of CPUs);",
+             "                   for rename, up to N directories at once "
+             "(default: 1)",
+             "    --no-shell     run commands directly rather than with "
+             "/bin/sh",
+             "    --group        with -j, show each command's output all in "
+             "one piece",
+             "    --keep-order   like --group, but in the order the commands "
+             "were given",
+             "    --coproc       feed commands to long-lived shells, one per "
+             "job",
+             "    --asyncio      run commands from an event loop rather than "
+             "threads",
+             "    --timeout SECS  stop any command still running after SECS "
+             "seconds",
+             "    --max-load N   run fewer commands at once while the load is "
+             "over N",
+             "    --min-free-mem SIZE  likewise while less memory than SIZE "
+             "(e.g. 2G) is",
+             "                   available",
+             "    --stats        report on where the time went to stderr when "
+             "done",
+             "    --stats-json FILE  write the --stats numbers to FILE as "
+             "JSON",
+             "    --trace FILE   write a timeline of the jobs to FILE for "
+             "Perfetto",
+             "    --profile FILE  profile fx itself into FILE (pstats, or "
+             "stacks if .folded)",
+             "    --pack         count: put as many values on each command "
+             "line as fit",
+             "    --max-args N   xargs, --pack: put at most N items on each "
+             "command line",
+             "    --max-chars N  xargs, --pack: keep command lines to N bytes",
+             "                   (default: ARG_MAX)",
+             "    --format FMT   count: write numbers with printf-style FMT, "
+             "e.g. %04d",
+             "    --incremental FILE  cmd: skip files unchanged since their "
+             "command last",
+             "                   succeeded, as recorded in FILE",
+             "    --checksum     with --incremental, tell changed files by "
+             "their contents",
+             "    --journal FILE  add each command and its exit status to "
+             "FILE",
+             "    --resume FILE  skip commands FILE says succeeded, then add "
+             "to it",
              ]
     result = tbx.run("python fx --help")
     assert result == "\n".join(exp_l) + "\n"
@@ -394,6 +1020,18 @@ def test_psys_quiet(tmpdir, capsys, data):
         assert exp == "".join(capsys.readouterr())
 
 
+# -----------------------------------------------------------------------------
+def test_psys_streams(capsys):
+    """
+    psys passes output along in chunks, so even a lot of it goes through
+    intact
+    """
+    pytest.dbgfunc()
+    v = {'-n': False, '-q': True}
+    fx.psys("python -c 'print(\"\\u00e9\" * 300000)'", v)
+    assert capsys.readouterr().out == "\u00e9" * 300000 + "\n"
+
+
 # -----------------------------------------------------------------------------
 def test_subst_command_both(tmpdir, capsys):
     """
@@ -570,6 +1208,53 @@ def test_version():
     assert result == "fx {}\n".format(fx.version.__version__)
 
 
+# -----------------------------------------------------------------------------
+def test_version_startup():
+    """
+    'fx version' shouldn't load what only running commands needs, and
+    shouldn't take much longer to start than python itself
+    """
+    pytest.dbgfunc()
+    result = subprocess.run([sys.executable, "-X", "importtime", FXDIR,
+                             "version"], stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    assert result.returncode == 0
+    loaded = {line.split("|")[-1].strip()
+              for line in result.stderr.splitlines()}
+    for heavy in ("asyncio", "concurrent.futures", "docopt", "pdb",
+                  "sqlite3", "subprocess", "tbx"):
+        assert heavy not in loaded
+
+    def fastest(*args):
+        rval = None
+        for _ in range(5):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + list(args),
+                           stdout=subprocess.DEVNULL, check=True)
+            elapsed = time.perf_counter() - start
+            rval = elapsed if rval is None else min(rval, elapsed)
+        return rval
+
+    assert fastest(FXDIR, "version") < fastest("-c", "pass") + STARTUP
+
+
+# -----------------------------------------------------------------------------
+def test_cmd_startup():
+    """
+    'fx cmd' only loads the sqlite3 behind --incremental when it's asked for
+    """
+    pytest.dbgfunc()
+    result = subprocess.run([sys.executable, "-X", "importtime", FXDIR,
+                             "cmd", "-q", "true", "x"],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    assert result.returncode == 0
+    loaded = {line.split("|")[-1].strip()
+              for line in result.stderr.splitlines()}
+    assert "sqlite3" not in loaded
+    assert "fx.index" not in loaded
+
+
 # ---------------------------------------------------------------------------
 def exp_xargs_data(prefix, knees):
     """
@@ -592,7 +1277,7 @@ def fx_batch(tmpdir):
     tmpfile = tmpdir.join('tmpfile')
     data = [str(x) + '\n' for x in range(1, 250)]
     tmpfile.write("".join(data))
-    rval = exp_xargs_data("echo ", [83, 147, 207, 250])
+    rval = exp_xargs_data("echo ", [82, 145, 204, 250])
     return tmpfile.strpath, rval
 
 
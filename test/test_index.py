@@ -0,0 +1,73 @@
+from fx import index
+import os
+import pytest
+
+
+# -----------------------------------------------------------------------------
+def test_stale(tmpdir):
+    """
+    A file is stale until its command is recorded as done, and again once its
+    size or mtime or the command changes
+    """
+    pytest.dbgfunc()
+    path = tmpdir.join("file")
+    path.write("data")
+    idx = index.Index(tmpdir.join("idx").strpath)
+    stamp = idx.stale(path.strpath, "cmd")
+    assert stamp is not None
+    idx.record(path.strpath, "cmd", stamp)
+    assert idx.stale(path.strpath, "cmd") is None
+    assert idx.stale(path.strpath, ["cmd", "x"]) is not None
+    os.utime(path.strpath, ns=(0, 0))
+    assert idx.stale(path.strpath, "cmd") is not None
+    idx.close()
+
+
+# -----------------------------------------------------------------------------
+def test_persists(tmpdir):
+    """
+    Records survive closing and reopening the index
+    """
+    pytest.dbgfunc()
+    path = tmpdir.join("file")
+    path.write("data")
+    db = tmpdir.join("idx").strpath
+    idx = index.Index(db)
+    idx.record(path.strpath, "cmd", idx.stale(path.strpath, "cmd"))
+    idx.close()
+    idx = index.Index(db)
+    assert idx.stale(path.strpath, "cmd") is None
+    idx.close()
+
+
+# -----------------------------------------------------------------------------
+def test_checksum(tmpdir):
+    """
+    With checksum, a file that's only been touched is still up to date but
+    one whose contents have changed is not
+    """
+    pytest.dbgfunc()
+    path = tmpdir.join("file")
+    path.write("data")
+    idx = index.Index(tmpdir.join("idx").strpath, checksum=True)
+    idx.record(path.strpath, "cmd", idx.stale(path.strpath, "cmd"))
+    os.utime(path.strpath, ns=(0, 0))
+    assert idx.stale(path.strpath, "cmd") is None
+    path.write("DATA")
+    assert idx.stale(path.strpath, "cmd") is not None
+    idx.close()
+
+
+# -----------------------------------------------------------------------------
+def test_missing(tmpdir):
+    """
+    A file that isn't there is stale and recording it does nothing
+    """
+    pytest.dbgfunc()
+    idx = index.Index(tmpdir.join("idx").strpath)
+    path = tmpdir.join("nosuch").strpath
+    stamp = idx.stale(path, "cmd")
+    assert stamp is False
+    idx.record(path, "cmd", stamp)
+    assert idx.stale(path, "cmd") is False
+    idx.close()
@@ -0,0 +1,35 @@
+from fx import inputs
+import io
+import pytest
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("data, sep, exp", [
+    ("one\ntwo  three\n\nfour", "\n", ["one", "two  three", "four"]),
+    ("one\0two\nthree\0", "\0", ["one", "two\nthree"]),
+    ("", "\n", []),
+    ])
+def test_split(data, sep, exp):
+    """
+    split() yields the non-empty items between separators, from text or
+    binary files alike
+    """
+    pytest.dbgfunc()
+    assert list(inputs.split(io.StringIO(data), sep)) == exp
+    assert list(inputs.split(io.BytesIO(data.encode()), sep)) == exp
+    wrapped = io.TextIOWrapper(io.BytesIO(data.encode()))
+    assert list(inputs.split(wrapped, sep)) == exp
+
+
+# -----------------------------------------------------------------------------
+def test_split_blocks(monkeypatch):
+    """
+    Items and multibyte characters that straddle a block boundary come
+    through whole, as do bytes that aren't valid UTF-8
+    """
+    pytest.dbgfunc()
+    monkeypatch.setattr(inputs, 'BLOCK', 3)
+    names = ["café", "naïveéé", "x", "bad\udcff"]
+    data = b"\0".join(name.encode('utf-8', 'surrogateescape')
+                      for name in names)
+    assert list(inputs.split(io.BytesIO(data), "\0")) == names
@@ -0,0 +1,78 @@
+from fx import journal
+from fx import pool
+import pytest
+
+
+# -----------------------------------------------------------------------------
+def test_record_succeeded(tmpdir):
+    """
+    succeeded() reports the commands whose latest run in the journal
+    succeeded
+    """
+    pytest.dbgfunc()
+    path = tmpdir.join("jnl").strpath
+    jnl = journal.Journal(path)
+    for (cmd, status) in [("a", 0), ("b", 1), (["c", "d e"], 0), ("a", 2),
+                          ("b", 0)]:
+        jnl.record(pool.Result(cmd, status))
+    jnl.close()
+    done = journal.succeeded(path)
+    assert done == {journal.key("b"), journal.key("c 'd e'")}
+    assert list(journal.skip(["a", "b", ["c", "d e"]], done)) == ["a"]
+
+
+# -----------------------------------------------------------------------------
+def test_cut_short(tmpdir):
+    """
+    A missing journal is empty, and a line cut short is ignored
+    """
+    pytest.dbgfunc()
+    path = tmpdir.join("jnl")
+    assert journal.succeeded(path.strpath) == set()
+    path.write('{"cmd": "a", "status": 0}\n{"cmd": "b", "sta')
+    assert journal.succeeded(path.strpath) == {journal.key("a")}
+
+
+# -----------------------------------------------------------------------------
+def test_append_after_cut_short(tmpdir):
+    """
+    Lines added after one cut short start on a line of their own, so a run
+    resumed from the journal sees them
+    """
+    pytest.dbgfunc()
+    path = tmpdir.join("jnl")
+    path.write('{"cmd": "echo 1", "sta')
+    jnl = journal.Journal(path.strpath)
+    jnl.record(pool.Result("echo 1", 0))
+    jnl.close()
+    assert path.read().endswith('sta\n{"cmd": "echo 1", "status": 0}\n')
+    assert journal.succeeded(path.strpath) == {journal.key("echo 1")}
+
+
+# -----------------------------------------------------------------------------
+def test_not_records(tmpdir):
+    """
+    Lines that are JSON but not records of commands are ignored
+    """
+    pytest.dbgfunc()
+    path = tmpdir.join("jnl")
+    path.write('[1, 2]\n"status"\n{"cmd": "a"}\n{"status": 0}\n'
+               '{"cmd": "b", "status": 0}\n')
+    assert journal.succeeded(path.strpath) == {journal.key("b")}
+
+
+# -----------------------------------------------------------------------------
+def test_sync_batches(tmpdir, monkeypatch):
+    """
+    The journal is fsync()ed every BATCH lines, not on every one
+    """
+    pytest.dbgfunc()
+    synced = []
+    monkeypatch.setattr(journal.os, 'fsync', synced.append)
+    monkeypatch.setattr(journal, 'SYNC', 3600)
+    jnl = journal.Journal(tmpdir.join("jnl").strpath)
+    for idx in range(2 * journal.BATCH + 5):
+        jnl.record(pool.Result(str(idx)))
+    assert len(synced) == 2
+    jnl.close()
+    assert len(synced) == 3
@@ -0,0 +1,152 @@
+from fx import aio
+from fx import pool
+import os
+import pytest
+import threading
+
+
+# -----------------------------------------------------------------------------
+def test_run_serial(capfd):
+    """
+    With jobs=1, each command is shown, then run, in order. The commands'
+    output goes straight to fx's stdout.
+    """
+    pytest.dbgfunc()
+    result = list(pool.run(["echo one", "echo two"]))
+    assert [r.status for r in result] == [0, 0]
+    assert capfd.readouterr().out == "echo one\none\necho two\ntwo\n"
+
+
+# -----------------------------------------------------------------------------
+def test_run_parallel(capfd):
+    """
+    With several jobs, every command is shown and runs exactly once
+    """
+    pytest.dbgfunc()
+    cmds = ["echo {}".format(idx) for idx in range(20)]
+    result = list(pool.run(iter(cmds), jobs=4))
+    assert sorted(r.cmd for r in result) == sorted(cmds)
+    lines = capfd.readouterr().out.splitlines()
+    assert sorted(lines) == sorted(cmds + [c.split()[1] for c in cmds])
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_run_status(jobs, capfd):
+    """
+    A failing command is reported with its non-zero exit status
+    """
+    pytest.dbgfunc()
+    result = {r.cmd: r.status
+              for r in pool.run(["true", "exit 3", "true"], quiet=True,
+                                jobs=jobs)}
+    assert result == {"true": 0, "exit 3": 3}
+
+
+# -----------------------------------------------------------------------------
+def test_run_dryrun(capsys):
+    """
+    With dryrun, nothing is run no matter how many jobs are allowed
+    """
+    pytest.dbgfunc()
+    result = list(pool.run(["exit 1", "exit 2"], dryrun=True, jobs=4))
+    assert [r.status for r in result] == [0, 0]
+    assert capsys.readouterr().out == "would do 'exit 1'\nwould do 'exit 2'\n"
+
+
+# -----------------------------------------------------------------------------
+def test_run_argv(capfd):
+    """
+    An argument list is run without a shell and shown quoted
+    """
+    pytest.dbgfunc()
+    [result] = pool.run([["echo", "a  b", "$HOME"]])
+    assert result.status == 0
+    assert capfd.readouterr().out == "echo 'a  b' '$HOME'\na  b $HOME\n"
+
+
+# -----------------------------------------------------------------------------
+def test_run_argv_missing(capsys):
+    """
+    A program that can't be found fails with status 127, as in the shell
+    """
+    pytest.dbgfunc()
+    [result] = pool.run([["no-such-program-here", "x"]], quiet=True)
+    assert result.status == 127
+    assert "no-such-program-here" in capsys.readouterr().err
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("engine", [pool, aio])
+def test_run_shell_unstartable(engine, capsys):
+    """
+    A shell command that can't be started is named whole in the message,
+    not by its first letter
+    """
+    pytest.dbgfunc()
+    cmd = "true " + "x" * 200000
+    [result] = engine.run([cmd], quiet=True)
+    assert result.status == 127
+    assert capsys.readouterr().err.startswith("fx: true xxx")
+
+
+# -----------------------------------------------------------------------------
+def test_run_streams(tmpdir):
+    """
+    Output is passed along as the command writes it, not when it finishes:
+    the second half of the command waits until the first line has shown up
+    downstream.
+    """
+    pytest.dbgfunc()
+    fifo = tmpdir.join("fifo").strpath
+    os.mkfifo(fifo)
+    cmd = "echo first; read line < {0}; echo $line".format(fifo)
+    rfd, wfd = os.pipe()
+    saved = os.dup(1)
+    os.dup2(wfd, 1)
+    try:
+        results = pool.run([cmd], quiet=True)
+        thread = threading.Thread(target=list, args=(results,))
+        thread.start()
+        with os.fdopen(rfd) as downstream:
+            assert downstream.readline() == "first\n"
+            with open(fifo, "w") as answer:
+                answer.write("second\n")
+            os.dup2(saved, 1)
+            os.close(wfd)
+            thread.join()
+            assert downstream.read() == "second\n"
+    finally:
+        os.dup2(saved, 1)
+        os.close(saved)
+
+
+# -----------------------------------------------------------------------------
+def test_run_group(capfd):
+    """
+    With group, each command and its output come out together, in the order
+    the commands finish
+    """
+    pytest.dbgfunc()
+    cmds = ["echo {0}a; sleep 0.{0}; echo {0}b".format(idx)
+            for idx in (3, 1, 2)]
+    result = [r.cmd for r in pool.run(cmds, jobs=3, group=True)]
+    assert result == [cmds[1], cmds[2], cmds[0]]
+    exp = "".join("{}\n{}a\n{}b\n".format(cmd, cmd[5], cmd[5])
+                  for cmd in result)
+    assert capfd.readouterr().out == exp
+
+
+# -----------------------------------------------------------------------------
+def test_run_keep_order(capsys):
+    """
+    With keep_order, output comes out in the order the commands were given,
+    even when stdout isn't a real file and sendfile() can't be used
+    """
+    pytest.dbgfunc()
+    cmds = ["sleep 0.0{0}; echo {0}".format(idx) for idx in range(9, 0, -1)]
+    result = [r.cmd for r in pool.run(cmds, quiet=True, jobs=4,
+                                      keep_order=True)]
+    assert result == cmds
+    assert capsys.readouterr().out == "".join("{}\n".format(idx)
+                                              for idx in range(9, 0, -1))
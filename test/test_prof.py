@@ -0,0 +1,54 @@
+from fx import pool
+from fx import prof
+from fx import template
+import pstats
+import pytest
+
+
+# -----------------------------------------------------------------------------
+def test_timers():
+    """
+    Timers count the calls to what they're installed on, and uninstall()
+    puts the originals back
+    """
+    pytest.dbgfunc()
+    render = template.Template.render
+    timers = prof.Timers()
+    timers.install([(template.Template, 'render', 'render')])
+    tmpl = template.Template("echo %")
+    assert [tmpl.render(str(num)) for num in range(3)] == [
+        "echo 0", "echo 1", "echo 2"]
+    timers.uninstall()
+    tmpl.render("x")
+    assert timers.totals['render'][0] == 3
+    assert template.Template.render is render
+    assert timers.report()[1].split()[:2] == ["render", "3"]
+
+
+# -----------------------------------------------------------------------------
+def test_profile_pstats(tmpdir, capsys):
+    """
+    A Profile writes cProfile stats and reports its timers on stderr
+    """
+    pytest.dbgfunc()
+    path = tmpdir.join("fx.prof").strpath
+    with prof.Profile(path):
+        list(pool.run(["true"], quiet=True))
+    assert pstats.Stats(path).total_calls
+    err = capsys.readouterr().err
+    assert "spawn" in err and "render" in err
+
+
+# -----------------------------------------------------------------------------
+def test_profile_folded(tmpdir):
+    """
+    With a .folded file, a Profile samples the stacks of every thread
+    """
+    pytest.dbgfunc()
+    path = tmpdir.join("fx.folded")
+    with prof.Profile(path.strpath):
+        sum(num * num for num in range(2000000))
+    lines = path.read().splitlines()
+    assert lines
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("test_prof.py:test_profile_folded" in line for line in lines)
@@ -0,0 +1,70 @@
+from fx import ranges
+import itertools
+import pytest
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("spec, exp", [
+    ("1:5", ["1", "2", "3", "4", "5"]),
+    ("1:10:3", ["1", "4", "7", "10"]),
+    ("5:1:-2", ["5", "3", "1"]),
+    ("7", ["7"]),
+    ("a|b|c", ["a", "b", "c"]),
+    ("1:3|10", ["1", "2", "3", "10"]),
+    ("0:1,a|b", ["0a", "0b", "1a", "1b"]),
+    ("x|y,1:2,z", ["x1z", "x2z", "y1z", "y2z"]),
+    ])
+def test_values(spec, exp):
+    """
+    Ranges include their high end, lists are run through in order, and
+    dimensions are combined with the first changing slowest
+    """
+    pytest.dbgfunc()
+    assert list(ranges.values(spec)) == exp
+
+
+# -----------------------------------------------------------------------------
+def test_exclusive():
+    """
+    With inclusive=False, the high end of a range is left out
+    """
+    pytest.dbgfunc()
+    assert list(ranges.values("1:4", inclusive=False)) == ["1", "2", "3"]
+    assert list(ranges.values("4:1:-1", inclusive=False)) == ["4", "3", "2"]
+
+
+# -----------------------------------------------------------------------------
+def test_format():
+    """
+    Numbers, but not other literals, are written with the format given
+    """
+    pytest.dbgfunc()
+    assert list(ranges.values("8:10|x|3", "%02d")) == [
+        "08", "09", "10", "x", "03"]
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("spec, fmt", [
+    ("1:2:3:4", "%d"),
+    ("1:x", "%d"),
+    ("1:5:0", "%d"),
+    ("1:5", "%s %s"),
+    ])
+def test_bad(spec, fmt):
+    """
+    Mistakes are reported before any values are generated
+    """
+    pytest.dbgfunc()
+    with pytest.raises(ValueError):
+        ranges.values(spec, fmt)
+
+
+# -----------------------------------------------------------------------------
+def test_lazy():
+    """
+    A range of billions of values, even as the inner dimension of a
+    combination, starts yielding right away
+    """
+    pytest.dbgfunc()
+    values = ranges.values("1:2,0:{}".format(10**12))
+    assert list(itertools.islice(values, 3)) == ["10", "11", "12"]
@@ -0,0 +1,204 @@
+from fx import rename
+import os
+import pytest
+import tbx
+
+
+# -----------------------------------------------------------------------------
+def test_plan(tmpdir):
+    """
+    plan() maps each name that changes to its new name and leaves out the
+    ones that don't change
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        result = rename.plan(["a.pl", "b.pl", "c.txt"], "s/.pl/.xyzzy/")
+    assert result == {"a.pl": "a.xyzzy", "b.pl": "b.xyzzy"}
+
+
+# -----------------------------------------------------------------------------
+def test_plan_collision(tmpdir):
+    """
+    Two files headed for the same name is an error, caught before anything
+    is renamed
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        with pytest.raises(rename.RenameError) as err:
+            rename.plan(["a1", "b1", "a2"], "s/[ab]/x/")
+    assert "a1 and b1 would both become x1" in str(err.value)
+
+
+# -----------------------------------------------------------------------------
+def test_plan_clobber(tmpdir):
+    """
+    Renaming onto an existing file that isn't moving itself is an error
+    """
+    pytest.dbgfunc()
+    for name in ["a1", "b1"]:
+        tmpdir.join(name).ensure()
+    with tbx.chdir(tmpdir.strpath):
+        with pytest.raises(rename.RenameError) as err:
+            rename.plan(["a1"], "s/a/b/")
+    assert "a1 would overwrite b1" in str(err.value)
+    assert tmpdir.join("a1").exists()
+
+
+# -----------------------------------------------------------------------------
+def test_plan_stream(tmpdir):
+    """
+    plan_stream() yields the renames in chunks and catches two files headed
+    for the same name even when they're in different chunks, before
+    yielding any
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        chunks = rename.plan_stream(iter(["a1", "a\udcff", "b2"]),
+                                    "s/[ab]/x/", size=2)
+        assert list(chunks) == [{"a1": "x1", "a\udcff": "x\udcff"},
+                                {"b2": "x2"}]
+        chunks = rename.plan_stream(iter(["a1", "a2", "b1"]), "s/[ab]/x/",
+                                    size=2)
+        with pytest.raises(rename.RenameError) as err:
+            next(chunks)
+    assert "b1 would become x1, as an earlier file did" in str(err.value)
+
+
+# -----------------------------------------------------------------------------
+def test_plan_no_name(tmpdir):
+    """
+    A substitution that leaves a file no name at all is an error
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        with pytest.raises(rename.RenameError) as err:
+            rename.plan(["abc"], "s/.*//")
+    assert "abc would have no name left" in str(err.value)
+
+
+# -----------------------------------------------------------------------------
+def test_fx_rename_stdin(tmpdir):
+    """
+    With no FILE arguments, 'fx rename' takes NUL separated names from stdin
+    """
+    pytest.dbgfunc()
+    fxdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                         "fx")
+    names = ["one a", "two\na", "three"]
+    for name in names:
+        tmpdir.join(name).write(name)
+    with tbx.chdir(tmpdir.strpath):
+        result = tbx.run("python {} rename -q -0 -e s/a$/b/".format(fxdir),
+                         input="\0".join(names) + "\0")
+    assert result == ""
+    assert sorted(os.listdir(tmpdir.strpath)) == ["one b", "three", "two\nb"]
+    assert tmpdir.join("two\nb").read() == "two\na"
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("renames", [
+    {"a": "b", "b": "c"},
+    {"b": "c", "a": "b"},
+    {"x": "y", "y": "x"},
+    {"p": "q", "q": "r", "r": "p", "s": "t"},
+    {"d1/a": "d1/b", "d1/b": "d1/a"},
+    ])
+def test_execute(tmpdir, renames):
+    """
+    Chains and cycles of renames are carried out without losing any file
+    """
+    pytest.dbgfunc()
+    tmpdir.join("d1").ensure(dir=True)
+    for name in renames:
+        tmpdir.join(name).write(name)
+    announced = []
+    with tbx.chdir(tmpdir.strpath):
+        rename.execute(renames, lambda old, new: announced.append(old))
+    assert sorted(announced) == sorted(renames)
+    for (old, new) in renames.items():
+        assert tmpdir.join(new).read() == old
+    leftovers = [name for name in os.listdir(tmpdir.strpath)
+                 if name.startswith(".fx-")]
+    assert leftovers == []
+
+
+# -----------------------------------------------------------------------------
+def test_execute_many(tmpdir):
+    """
+    A large shift, where every file takes the name of the next one, ends up
+    with each file moved exactly one place along
+    """
+    pytest.dbgfunc()
+    count = 2000
+    names = ["f{:05d}".format(idx) for idx in range(count)]
+    for name in names:
+        tmpdir.join(name).write(name)
+    with tbx.chdir(tmpdir.strpath):
+        renames = {name: "f{:05d}".format((int(name[1:]) + 1) % count)
+                   for name in names}
+        rename.check(renames)
+        rename.execute(renames)
+    for idx in range(count):
+        assert tmpdir.join(names[(idx + 1) % count]).read() == names[idx]
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_execute_dirs(tmpdir, jobs):
+    """
+    Renames spread over several directories are done a directory at a time,
+    each relative to the directory, possibly several directories at once
+    """
+    pytest.dbgfunc()
+    renames = {}
+    for sub in ["d{}".format(idx) for idx in range(6)]:
+        for name in ["a", "b", "c"]:
+            tmpdir.join(sub, name).write(sub + name, ensure=True)
+        renames.update({os.path.join(sub, "a"): os.path.join(sub, "b"),
+                        os.path.join(sub, "b"): os.path.join(sub, "a"),
+                        os.path.join(sub, "c"): os.path.join(sub, "c.new")})
+    assert len(rename.by_directory(renames)) == 6
+    announced = []
+    with tbx.chdir(tmpdir.strpath):
+        rename.execute(renames, lambda old, new: announced.append(old), jobs)
+    assert sorted(announced) == sorted(renames)
+    for (old, new) in renames.items():
+        assert tmpdir.join(new).read() == old.replace(os.sep, "")
+
+
+# -----------------------------------------------------------------------------
+def test_execute_across_dirs(tmpdir):
+    """
+    Files moving between directories are renamed by path
+    """
+    pytest.dbgfunc()
+    renames = {"d1/x": "d2/x", "d2/x": "d1/x"}
+    assert rename.by_directory(renames) is None
+    for name in renames:
+        tmpdir.join(name).write(name, ensure=True)
+    with tbx.chdir(tmpdir.strpath):
+        rename.execute(renames, jobs=4)
+    assert tmpdir.join("d1/x").read() == "d2/x"
+    assert tmpdir.join("d2/x").read() == "d1/x"
+
+
+# -----------------------------------------------------------------------------
+def test_fx_rename_swap(tmpdir):
+    """
+    'fx rename' can swap two names, and refuses to clobber a file
+    """
+    pytest.dbgfunc()
+    fxdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                         "fx")
+    for name in ["ab", "ba", "dc", "dc0"]:
+        tmpdir.join(name).write(name)
+    with tbx.chdir(tmpdir.strpath):
+        result = tbx.run("python {} rename -e 's/(.)(.)/\\2\\1/' ab ba"
+                         .format(fxdir))
+        assert result == "renaming ab -> ba\nrenaming ba -> ab\n"
+        result = tbx.run("python {} rename -e 's/0//' dc0".format(fxdir))
+        assert "dc0 would overwrite dc" in result
+    for name in ["ab", "ba"]:
+        assert tmpdir.join(name).read() == name[::-1]
+    for name in ["dc", "dc0"]:
+        assert tmpdir.join(name).read() == name
@@ -0,0 +1,72 @@
+from fx import pool
+from fx import stats
+import pytest
+
+
+# -----------------------------------------------------------------------------
+def test_percentile():
+    """
+    Percentiles are taken by nearest rank
+    """
+    pytest.dbgfunc()
+    durations = [float(num) for num in range(1, 101)]
+    assert stats.percentile(durations, 50) == 50.0
+    assert stats.percentile(durations, 99) == 99.0
+    assert stats.percentile(durations[:3], 50) == 2.0
+    assert stats.percentile([], 50) is None
+
+
+# -----------------------------------------------------------------------------
+def test_histogram():
+    """
+    Durations are counted in buckets doubling from a millisecond, leaving out
+    the empty ones below the first that isn't
+    """
+    pytest.dbgfunc()
+    hist = stats.histogram([0.003, 0.0035, 0.005, 0.015])
+    assert hist == [[0.004, 2], [0.008, 1], [0.016, 1]]
+    assert stats.histogram([]) == []
+
+
+# -----------------------------------------------------------------------------
+def test_summary():
+    """
+    The summary counts the commands run, the failures and the processes,
+    keeps the slowest commands, and has per job resource usage where known
+    """
+    pytest.dbgfunc()
+    tally = stats.Stats(slowest=2)
+    for result in pool.run(["sleep 0.2", "exit 1", "sleep 0.1", "true"],
+                           quiet=True):
+        tally.add(result)
+    tally.finish()
+    summary = tally.summary()
+    assert summary['jobs'] == 4
+    assert summary['failed'] == 1
+    assert summary['processes'] == 4
+    assert [job['cmd'] for job in summary['slowest']] == ["sleep 0.2",
+                                                          "sleep 0.1"]
+    assert 'user' in summary['slowest'][0]
+    assert 0.3 <= summary['job_time'] <= summary['wall']
+    assert sum(count for (_, count) in summary['histogram']) == 4
+    assert stats.text(summary)[0].startswith("fx: 4 jobs (1 failed) in ")
+
+
+# -----------------------------------------------------------------------------
+def test_output_bytes():
+    """
+    Output is counted only where it was spooled; where none was, the count
+    is None rather than 0
+    """
+    pytest.dbgfunc()
+    tally = stats.Stats()
+    tally.add(pool.Result("true", start=0.0, end=0.1))
+    summary = tally.summary()
+    assert summary['output_bytes'] is None
+    assert "output not spooled" in stats.text(summary)[1]
+    spooled = pool.Result("echo hi", start=0.0, end=0.1)
+    spooled.out_bytes = 3
+    tally.add(spooled)
+    summary = tally.summary()
+    assert summary['output_bytes'] == 3
+    assert "3 bytes of output spooled" in stats.text(summary)[1]
@@ -0,0 +1,135 @@
+from fx import template
+import pytest
+import tbx
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("cmd, item, exp", [
+    ('ls %', 'a.pl', 'ls a.pl'),
+    ('mv % %.bak', 'a.pl', 'mv a.pl a.pl.bak'),
+    ('ls', 'a.pl', 'ls'),
+    ('cp % ~/$USER/', 'a.pl', 'cp a.pl /home/dir/user/'),
+    ('ls %', '$USER~\\1', 'ls $USER~\\1'),
+    ])
+def test_render(cmd, item, exp):
+    """
+    Template.render() puts the item in place of each '%'. '~' and '$VARS' in
+    the template are expanded but the items are taken literally.
+    """
+    pytest.dbgfunc()
+    with tbx.envset(HOME='/home/dir', USER='user'):
+        tmpl = template.Template(cmd)
+    assert tmpl.render(item) == exp
+
+
+# -----------------------------------------------------------------------------
+def test_render_expands_once():
+    """
+    The template is expanded when it's compiled, not each time it's rendered
+    """
+    pytest.dbgfunc()
+    with tbx.envset(USER='user'):
+        tmpl = template.Template('echo $USER %')
+    with tbx.envset(USER='other'):
+        assert tmpl.render('x') == 'echo user x'
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("cmd, exp", [
+    ('foobar', 'foobar one two three'),
+    ('foobar %', 'foobar one two three'),
+    ('% foobar', 'one two three foobar'),
+    ('foo% bar', 'fooone footwo foothree bar'),
+    ('foo %bar', 'foo onebar twobar threebar'),
+    ('foo % bar', 'foo one two three bar'),
+    ('foo%bar', 'fooonebar footwobar foothreebar'),
+    ('a%b%c', 'aonebonec atwobtwoc athreebthreec'),
+    ('~/% $USER', '/home/dir/one /home/dir/two /home/dir/three user'),
+    ])
+def test_xargs_render(cmd, exp):
+    """
+    XargsTemplate.render() repeats the word containing '%' once per item
+    """
+    pytest.dbgfunc()
+    with tbx.envset(HOME='/home/dir', USER='user'):
+        tmpl = template.XargsTemplate(cmd)
+    assert tmpl.render(["one", "two", "three"]) == exp
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("cmd", ['echo', 'echo % end', 'cp %.bak dir'])
+def test_xargs_size(cmd):
+    """
+    The running size XargsTemplate keeps track of is exactly the length of
+    the rendered command line
+    """
+    pytest.dbgfunc()
+    tmpl = template.XargsTemplate(cmd)
+    items = ["one", "twö", "three"]
+    size = tmpl.size + sum(tmpl.item_size(item) for item in items)
+    assert size == len(tmpl.render(items).encode())
+
+
+# -----------------------------------------------------------------------------
+def test_xargs_metachars():
+    """
+    Regex metacharacters in the template or the items are taken literally
+    """
+    pytest.dbgfunc()
+    tmpl = template.XargsTemplate(r'grep -e a.*% \1')
+    assert tmpl.render([r'\1', '(']) == r'grep -e a.*\1 a.*( \1'
+
+
+# -----------------------------------------------------------------------------
+def test_xargs_two_words():
+    """
+    Only one word of the template may contain '%'
+    """
+    pytest.dbgfunc()
+    with pytest.raises(ValueError):
+        template.XargsTemplate('mv % %.bak')
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("cls", [template.ArgvTemplate,
+                                 template.XargsArgvTemplate])
+def test_argv_unsplittable(cls):
+    """
+    A template shlex can't split is a ValueError naming the template
+    """
+    pytest.dbgfunc()
+    with pytest.raises(ValueError) as err:
+        cls("echo 'a %")
+    assert "echo 'a %" in str(err.value)
+
+
+# -----------------------------------------------------------------------------
+def test_argv_render():
+    """
+    ArgvTemplate splits the template into arguments once and substitutes
+    into each argument, so items with spaces stay single arguments
+    """
+    pytest.dbgfunc()
+    with tbx.envset(HOME='/home/dir'):
+        tmpl = template.ArgvTemplate("cp -p '% x' ~/%.bak")
+    assert tmpl.render("a b") == ['cp', '-p', 'a b x', '/home/dir/a b.bak']
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("cmd, exp", [
+    ('echo', ['echo', 'a b', 'c']),
+    ('echo % end', ['echo', 'a b', 'c', 'end']),
+    ('cp -t dir x%', ['cp', '-t', 'dir', 'xa b', 'xc']),
+    ])
+def test_xargs_argv_render(cmd, exp):
+    """
+    XargsArgvTemplate repeats the argument containing '%' once per item and
+    counts sizes the way exec() does
+    """
+    pytest.dbgfunc()
+    tmpl = template.XargsArgvTemplate(cmd)
+    items = ["a b", "c"]
+    result = tmpl.render(items)
+    assert result == exp
+    size = tmpl.size + sum(tmpl.item_size(item) for item in items)
+    assert size == sum(len(arg) + template.ARG_OVERHEAD for arg in result)